@@ -0,0 +1,75 @@
+# AssetStore.py
+import hashlib
+import os
+import cv2
+import numpy as np
+
+HEADER_SIZE = (1280, 125)  # (width, height) of the header bar
+GUIDE_SIZE = (1280, 595)  # Guides fit below the header
+
+
+class AssetStore:
+    """Header and guide images, decoded and resized once and kept as contiguous arrays
+
+    headers is an (n, 125, 1280, 3) array and guides an (n, 595, 1280, 3) array,
+    both in file name order, so they index exactly like the old image lists.
+    With atlasFolder set, the prepared arrays are also written there as .npy
+    files and memory-mapped on the next start instead of decoding the PNGs again.
+    An atlas is rebuilt automatically when the source images change.
+    """
+
+    def __init__(self, headerFolder='header', guideFolder='guide', atlasFolder=None):
+        self.atlasFolder = atlasFolder
+        self.headers = self.load('header', headerFolder, HEADER_SIZE)
+        self.guides = self.load('guide', guideFolder, GUIDE_SIZE)
+
+    def load(self, name, folderPath, size):
+        files = [os.path.join(folderPath, imPath) for imPath in sorted(os.listdir(folderPath))]
+        if self.atlasFolder is None:
+            return self.decode(files, size)
+
+        atlasPath = os.path.join(self.atlasFolder, f"{name}-{self.signature(files, size)}.npy")
+        if os.path.exists(atlasPath):
+            try:
+                return np.load(atlasPath, mmap_mode='r')
+            except (OSError, ValueError):
+                pass  # Unreadable atlas, build it again below
+
+        images = self.decode(files, size)
+        tmpPath = f"{atlasPath}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.atlasFolder, exist_ok=True)
+            for old in os.listdir(self.atlasFolder):
+                if old.startswith(f"{name}-") and old.endswith(".npy"):
+                    os.remove(os.path.join(self.atlasFolder, old))
+            with open(tmpPath, 'wb') as f:
+                np.save(f, images)
+            os.replace(tmpPath, atlasPath)
+            return np.load(atlasPath, mmap_mode='r')
+        except OSError:
+            # Read-only folder, full disk or another process replacing the atlas:
+            # use the decoded images and try again on the next start
+            if os.path.exists(tmpPath):
+                os.remove(tmpPath)
+            return images
+
+    @staticmethod
+    def decode(files, size):
+        images = []
+        for path in files:
+            img = cv2.imread(path)
+            if img is None:
+                continue
+            if (img.shape[1], img.shape[0]) != size:
+                img = cv2.resize(img, size)
+            images.append(img)
+        return np.ascontiguousarray(np.stack(images))
+
+    @staticmethod
+    def signature(files, size):
+        """Changes whenever a source image or the target size changes"""
+        digest = hashlib.sha1(repr(size).encode())
+        for path in files:
+            stat = os.stat(path)
+            digest.update(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+        return digest.hexdigest()[:12]
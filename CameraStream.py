@@ -0,0 +1,68 @@
+# CameraStream.py
+import threading
+import time
+import cv2
+
+
+class CameraStream:
+    """Reads a cv2.VideoCapture on its own thread and keeps only the newest frame"""
+
+    def __init__(self, cap):
+        self.cap = cap
+        # Ask OpenCV to keep as few frames queued as possible so reads are fresh
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+        self.frame = None
+        self.timestamp = 0.0  # time.monotonic() when the newest frame arrived
+        self.frame_id = 0  # Increments for every frame grabbed from the camera
+        self.last_read_id = 0  # Last frame_id handed out by read()
+        self.read_timestamp = 0.0  # Capture time of the frame last handed out by read()
+
+        self.condition = threading.Condition()
+        self.stopped = False
+        self.thread = None
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.stopped = False
+            self.thread = threading.Thread(target=self._update, name="CameraStream", daemon=True)
+            self.thread.start()
+        return self
+
+    def _update(self):
+        while not self.stopped:
+            success, img = self.cap.read()
+            if not success:
+                time.sleep(0.01)
+                continue
+
+            with self.condition:
+                self.frame = img
+                self.timestamp = time.monotonic()
+                self.frame_id += 1
+                self.condition.notify_all()
+
+    def read(self, timeout=1.0):
+        """Wait for a frame newer than the last one read and return (success, img) like cap.read()"""
+        with self.condition:
+            if not self.condition.wait_for(
+                    lambda: self.stopped or self.frame_id != self.last_read_id, timeout):
+                return False, None
+            if self.stopped or self.frame is None:
+                return False, None
+            self.last_read_id = self.frame_id
+            self.read_timestamp = self.timestamp
+            return True, self.frame
+
+    def stop(self):
+        self.stopped = True
+        with self.condition:
+            self.condition.notify_all()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=1.0)
+        self.thread = None
+
+    def release(self):
+        """Stop the capture thread and release the underlying camera"""
+        self.stop()
+        self.cap.release()
@@ -0,0 +1,80 @@
+# CanvasSaver.py
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+from Strokes import Stroke, to_svg
+
+# File extension and the cv2.imwrite parameter that the save level sets, per format
+SAVE_FORMATS = {
+    'png': ('.png', cv2.IMWRITE_PNG_COMPRESSION),  # 0 (fast, large) .. 9 (slow, small)
+    'webp': ('.webp', cv2.IMWRITE_WEBP_QUALITY),  # 1 .. 100, above 100 is lossless
+    'jpeg': ('.jpg', cv2.IMWRITE_JPEG_QUALITY),  # 0 .. 100
+}
+
+
+class CanvasSaver:
+    """Writes saved paintings on a background thread so the frame loop never waits for the disk
+
+    save() only copies what it needs; rendering the text, encoding and writing
+    happen on the writer thread and the outcome is reported through notify(kind,
+    message) from there. Saves closer together than debounce seconds are
+    ignored, and a painting identical to the last one written is not written
+    again.
+    """
+
+    def __init__(self, notify, folder=None, format='png', level=3, debounce=1.0):
+        self.notify = notify
+        self.folder = folder or os.path.join(os.path.expanduser("~"), "Pictures")
+        self.format = format
+        self.level = level
+        self.debounce = debounce
+
+        self.last_request = 0.0
+        self.last_digest = None  # Only used on the writer thread
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="CanvasSaver")
+
+    def save(self, image, text_objects, strokes):
+        """Queue a save of the canvas image (copied here) with its text objects and strokes"""
+        now = time.monotonic()
+        if now - self.last_request < self.debounce:
+            return False
+        self.last_request = now
+        # Copy the strokes too, the one being drawn keeps growing
+        strokes = [Stroke(stroke.color, stroke.width, stroke.points) for stroke in strokes]
+        self.executor.submit(self.write, image.copy(), [dict(obj) for obj in text_objects], strokes,
+                             image.shape[1], image.shape[0])
+        return True
+
+    def write(self, saved_img, text_objects, strokes, width, height):
+        try:
+            # Draw all text objects onto the saved image
+            for obj in text_objects:
+                cv2.putText(saved_img, obj['text'], obj['position'], obj['font'], obj['scale'],
+                            obj['color'], obj['thickness'] + 2)
+
+                # Then draw main text
+                cv2.putText(saved_img, obj['text'], obj['position'], obj['font'], obj['scale'],
+                            obj['color'], obj['thickness'])
+
+            digest = hashlib.blake2b(saved_img.data, digest_size=16).digest()
+            if digest == self.last_digest:
+                self.notify('info', "Canvas unchanged since the last save")
+                return
+            self.last_digest = digest
+
+            extension, param = SAVE_FORMATS[self.format]
+            timestamp = time.strftime("%Y%m%d_%H%M%S")
+            save_path = os.path.join(self.folder, f"saved_painting_{timestamp}{extension}")
+            if not cv2.imwrite(save_path, saved_img, [param, self.level]):
+                raise OSError(f"could not write {save_path}")
+
+            # The same painting as vectors, from the recorded strokes
+            svg_path = os.path.splitext(save_path)[0] + ".svg"
+            with open(svg_path, 'w') as f:
+                f.write(to_svg(strokes, text_objects, width, height))
+            self.notify('success', f"Canvas Saved at {save_path} and {svg_path}")
+        except Exception as e:
+            self.last_digest = None
+            self.notify('error', f"Saving the canvas failed: {e}")
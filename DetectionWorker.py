@@ -0,0 +1,268 @@
+# DetectionWorker.py
+import multiprocessing
+import threading
+import weakref
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+import HandTrackingModule as htm
+
+
+def _worker_main(conn, shmName, options):
+    """Runs in the worker process: read frames from shared memory, send back landmark arrays"""
+    try:
+        shm = shared_memory.SharedMemory(name=shmName)
+        detector = htm.handDetector(**options)
+    except Exception as e:
+        conn.send(('error', f"{type(e).__name__}: {e}"))
+        return
+    conn.send(('ready', None))
+
+    try:
+        while True:
+            msg = conn.recv()
+            if msg[0] == 'stop':
+                break
+            if msg[0] == 'configure':
+                detector.configure(**msg[1])
+                continue
+            if msg[0] == 'reset':
+                detector.reset()
+                continue
+
+            _, shape, timestamp, settings = msg
+            for name, value in settings.items():
+                setattr(detector, name, value)
+
+            img = np.ndarray(shape, np.uint8, buffer=shm.buf)
+            detector.findHands(img, draw=False, timestamp=timestamp)
+            positions = detector.findPositionArray(img)
+            del img  # Release the view before the buffer can be closed
+            conn.send((positions, detector.handLabels(), detector.inferenceCalls))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        shm.close()
+
+
+def _shutdown(conn, process, shm):
+    try:
+        conn.send(('stop',))
+    except (OSError, ValueError):
+        pass
+    process.join(timeout=2.0)
+    if process.is_alive():
+        process.terminate()
+    conn.close()
+    shm.close()
+    shm.unlink()
+
+
+class ProcessDetector:
+    """handDetector running in its own process, so inference does not compete for the GIL
+
+    Frames go to the worker through shared memory and landmarks come back as
+    (hands, 21, 3) arrays, so drawing and encoding can overlap with inference
+    on another core (most effective with pipelined processing). If the worker
+    cannot start or dies, it falls back to an in-process handDetector and
+    records why in self.error.
+    """
+
+    # Finger rules and list-based wrappers are shared with handDetector
+    tipIds = [4, 8, 12, 16, 20]
+    fingersUpArray = htm.handDetector.fingersUpArray
+    findPosition = htm.handDetector.findPosition
+    fingersUp = htm.handDetector.fingersUp
+
+    def __init__(self, frameShape=(720, 1280, 3), startTimeout=60.0, **options):
+        self.options = options
+        self.latency = 0.0
+        self.redetect = False
+        self.inferenceCalls = 0
+
+        self.positions = np.zeros((0, 21, 3), np.float32)
+        self.labels = []
+        self.hand = None
+        self.lmList = []
+        self.mpHands = htm.mp.solutions.hands
+
+        self.fallback = None
+        self.error = None
+        self.process = None
+        try:
+            self.start(frameShape, startTimeout)
+        except Exception as e:
+            self.use_fallback(f"Detection worker failed to start: {e!r}")
+
+    def start(self, frameShape, startTimeout):
+        ctx = multiprocessing.get_context('spawn')
+        self.capacity = int(np.prod(frameShape))
+        self.shm = shared_memory.SharedMemory(create=True, size=self.capacity)
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child, self.shm.name, self.options),
+                                   name="DetectionWorker", daemon=True)
+        self.process.start()
+        child.close()
+        self.finalizer = weakref.finalize(self, _shutdown, self.conn, self.process, self.shm)
+
+        if not self.conn.poll(startTimeout):
+            self.finalizer()
+            raise RuntimeError("timed out waiting for the worker")
+        status, message = self.conn.recv()
+        if status != 'ready':
+            self.finalizer()
+            raise RuntimeError(message)
+
+    def use_fallback(self, reason):
+        self.error = reason
+        if self.process is not None:
+            self.finalizer()
+            self.process = None
+        self.fallback = htm.handDetector(**self.options)
+
+    def findHands(self, img, draw=True, timestamp=None):
+        self.labels = None
+        if self.fallback is None and img.nbytes > self.capacity:
+            self.use_fallback(f"Frame of shape {img.shape} does not fit the shared frame buffer")
+
+        if self.fallback is not None:
+            self.fallback.latency = self.latency
+            if self.redetect:
+                self.fallback.requestRedetect()
+            img = self.fallback.findHands(img, draw, timestamp)
+            self.positions = self.fallback.findPositionArray(img)
+            self.labels = self.fallback.handLabels()
+            self.inferenceCalls = self.fallback.inferenceCalls
+            self.redetect = False
+            return img
+
+        settings = {'latency': self.latency}
+        if self.redetect:
+            settings['redetect'] = True
+            self.redetect = False
+
+        try:
+            shared = np.ndarray(img.shape, np.uint8, buffer=self.shm.buf)
+            shared[:] = img
+            del shared
+            self.conn.send(('frame', img.shape, timestamp, settings))
+            self.positions, self.labels, self.inferenceCalls = self.conn.recv()
+        except (EOFError, OSError) as e:
+            self.use_fallback(f"Detection worker stopped: {e!r}")
+            return self.findHands(img, draw, timestamp)
+
+        if draw:
+            self.drawLandmarks(img)
+        return img
+
+    def drawLandmarks(self, img):
+        for hand in self.positions[:, :, :2].astype(np.int32).tolist():
+            for start, end in self.mpHands.HAND_CONNECTIONS:
+                cv2.line(img, tuple(hand[start]), tuple(hand[end]), (255, 255, 255), 2)
+            for x, y in hand:
+                cv2.circle(img, (x, y), 4, (0, 0, 255), cv2.FILLED)
+
+    def findPositionArray(self, img):
+        return self.positions
+
+    def handLabels(self):
+        return self.labels
+
+    def reportLatency(self, seconds, weight=0.1):
+        self.latency += weight * (seconds - self.latency)
+
+    def requestRedetect(self):
+        self.redetect = True
+
+    def send(self, msg):
+        try:
+            self.conn.send(msg)
+        except (EOFError, OSError) as e:
+            self.use_fallback(f"Detection worker stopped: {e!r}")
+
+    def configure(self, **options):
+        """Same as handDetector.configure, applied in the worker"""
+        for name in options:
+            if name not in htm.handDetector.tunableOptions:
+                raise ValueError(f"{name} cannot be changed without creating a new handDetector")
+        self.options.update(options)
+        if self.fallback is not None:
+            self.fallback.configure(**options)
+        else:
+            self.send(('configure', options))
+
+    def reset(self):
+        self.positions = np.zeros((0, 21, 3), np.float32)
+        self.labels = []
+        self.hand = None
+        self.lmList = []
+        self.latency = 0.0
+        self.redetect = False
+        if self.fallback is not None:
+            self.fallback.reset()
+        else:
+            self.send(('reset',))
+
+    def warmup(self, shape=(720, 1280, 3)):
+        self.findHands(np.zeros(shape, np.uint8), draw=False)
+        self.reset()
+
+    def close(self):
+        """Stop the worker process and free the shared frame buffer"""
+        if self.process is not None:
+            self.finalizer()
+            self.process = None
+
+
+def create_detector(backend='in-process', **options):
+    """Hand detector for the chosen backend: 'in-process' or 'process'"""
+    if backend == 'process':
+        return ProcessDetector(**options)
+    return htm.handDetector(**options)
+
+
+class DetectorPool:
+    """Warmed-up detectors for one backend and configuration, shared by every session in the process
+
+    Building a MediaPipe graph is slow, so detectors are created once and lent out.
+    Each lease has the detector to itself, because the detector keeps per-stream
+    state (tracking, smoothing), and gives it back when the lease is released or
+    garbage collected, e.g. when the session that held it ends.
+    """
+
+    def __init__(self, backend='in-process', **options):
+        self.backend = backend
+        self.options = options
+        self.idle = []
+        self.lock = threading.Lock()
+        # Warm up one detector straight away so the first session does not wait for the model
+        self.idle.append(self.create())
+
+    def create(self):
+        detector = create_detector(self.backend, **self.options)
+        detector.warmup()
+        return detector
+
+    def acquire(self):
+        with self.lock:
+            detector = self.idle.pop() if self.idle else None
+        if detector is None:
+            detector = self.create()
+        return DetectorLease(self, detector)
+
+    def give_back(self, detector):
+        detector.reset()
+        with self.lock:
+            self.idle.append(detector)
+
+
+class DetectorLease:
+    """A detector borrowed from a DetectorPool"""
+
+    def __init__(self, pool, detector):
+        self.pool = pool
+        self.detector = detector
+        self.finalizer = weakref.finalize(self, pool.give_back, detector)
+
+    def release(self):
+        self.finalizer()
@@ -0,0 +1,87 @@
+# FramePipeline.py
+import queue
+import threading
+
+
+class FramePipeline:
+    """Runs each stage on its own thread with bounded queues in between
+
+    source() produces the next item (or None to skip), each stage takes an item
+    and returns it. Every stage is a single thread reading a FIFO queue, so
+    items reach each stage, and come out of get(), in the order they were produced.
+    """
+
+    def __init__(self, source, stages, queue_size=2):
+        self.source = source
+        self.stages = list(stages)
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in range(len(self.stages) + 1)]
+        self.stopped = threading.Event()
+        self.error = None
+        self.threads = []
+
+    def start(self):
+        self.threads = [threading.Thread(target=self._run_source, name="FramePipeline-source", daemon=True)]
+        for i, stage in enumerate(self.stages):
+            name = f"FramePipeline-{getattr(stage, '__name__', i)}"
+            self.threads.append(threading.Thread(target=self._run_stage, args=(i, stage), name=name, daemon=True))
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def _put(self, q, item):
+        # Block for backpressure, but keep checking whether we were stopped
+        while not self.stopped.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _fail(self, e):
+        if self.error is None:
+            self.error = e
+        self.stopped.set()
+
+    def _run_source(self):
+        try:
+            while not self.stopped.is_set():
+                item = self.source()
+                if item is not None:
+                    self._put(self.queues[0], item)
+        except Exception as e:
+            self._fail(e)
+
+    def _run_stage(self, i, stage):
+        q_in, q_out = self.queues[i], self.queues[i + 1]
+        try:
+            while not self.stopped.is_set():
+                try:
+                    item = q_in.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                self._put(q_out, stage(item))
+        except Exception as e:
+            self._fail(e)
+
+    def get(self, timeout=1.0):
+        """Next finished item, or None if nothing was ready in time. Re-raises stage errors."""
+        if self.error is not None:
+            raise self.error
+        try:
+            return self.queues[-1].get(timeout=timeout)
+        except queue.Empty:
+            if self.error is not None:
+                raise self.error
+            return None
+
+    def backlog(self):
+        """Number of finished items waiting to be taken with get()"""
+        return self.queues[-1].qsize()
+
+    def stop(self):
+        self.stopped.set()
+        for thread in self.threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout=1.0)
+        self.threads = []
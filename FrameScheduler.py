@@ -0,0 +1,62 @@
+# FrameScheduler.py
+import time
+from collections import deque
+
+
+class FrameScheduler:
+    """Paces a frame loop to a target rate using monotonic deadlines
+
+    Every frame has a deadline one interval after the previous one. wait()
+    sleeps until the next deadline when the loop is ahead; when it is behind
+    it does not sleep at all, and once a whole slot has been missed it
+    restarts from now instead of rushing to catch up. late() tells the loop
+    that the current frame is already past its slot, so it can drop the frame
+    (skip encoding and showing it) rather than fall further behind.
+    """
+
+    def __init__(self, fps=30.0, window=1.0):
+        self.fps = fps
+        self.interval = 1.0 / fps
+        self.window = window  # Seconds the achieved rate is measured over
+        self.deadline = time.monotonic() + self.interval
+        self.shown = deque()  # time.monotonic() of the frames shown within the window
+        self.dropped = 0
+        self.just_dropped = False
+        self.reported = 0.0  # When report() was last shown
+
+    def wait(self):
+        """Sleep until the current frame is due, then move on to the next deadline; returns the seconds slept"""
+        now = time.monotonic()
+        slept = 0.0
+        if now < self.deadline:
+            slept = self.deadline - now
+            time.sleep(slept)
+        elif now - self.deadline > self.interval:
+            self.deadline = now  # Fell behind by a whole slot, do not try to make it up
+        self.deadline += self.interval
+        return slept
+
+    def late(self):
+        """Whether the current frame has missed its slot by more than a whole interval
+
+        Never twice in a row, so a loop that is always behind still shows every other frame.
+        """
+        return not self.just_dropped and time.monotonic() > self.deadline + self.interval
+
+    def drop(self):
+        self.dropped += 1
+        self.just_dropped = True
+
+    def frame_shown(self):
+        self.just_dropped = False
+        now = time.monotonic()
+        self.shown.append(now)
+        while self.shown and self.shown[0] < now - self.window:
+            self.shown.popleft()
+
+    def achieved(self):
+        """Frames per second shown over the last window"""
+        return len(self.shown) / self.window
+
+    def report(self):
+        return f"{self.achieved():.1f} / {self.fps:g} fps, {self.dropped} frames dropped"
@@ -1,19 +1,109 @@
 from cvzone import HandTrackingModule
 # HandTrackingModule.py
 import cv2
+import math
 import mediapipe as mp
 import time
 import streamlit as st
 import numpy as np
 
 
+class OneEuroFilter:
+    """One Euro filter (Casiez et al., CHI 2012): smooths slow movement, follows fast movement"""
+
+    def __init__(self, minCutoff=1.0, beta=0.007, dCutoff=1.0):
+        self.minCutoff = minCutoff
+        self.beta = beta
+        self.dCutoff = dCutoff
+        self.reset()
+
+    def reset(self):
+        self.x = None
+        self.dx = None
+        self.t = None
+
+    @staticmethod
+    def alpha(cutoff, dt):
+        tau = 1.0 / (2 * np.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def __call__(self, x, t):
+        x = np.asarray(x, dtype=np.float64)
+        if self.x is None:
+            self.x = x.copy()
+            self.dx = np.zeros_like(x)
+            self.t = t
+            return self.x.copy()
+
+        dt = t - self.t
+        if dt <= 0:
+            # Same frame again, keep the last estimate
+            return self.x.copy()
+        self.t = t
+
+        # Filtered derivative, then a cutoff that rises with speed
+        a_d = self.alpha(self.dCutoff, dt)
+        self.dx = a_d * (x - self.x) / dt + (1 - a_d) * self.dx
+        cutoff = self.minCutoff + self.beta * np.abs(self.dx)
+        a = self.alpha(cutoff, dt)
+        self.x = a * x + (1 - a) * self.x
+        return self.x.copy()
+
+
 class handDetector:
-    def __init__(self, mode=False, maxHands=2, detectionCon=0.5, trackCon=0.5):
+    # Options that configure() can change without rebuilding the MediaPipe graph
+    tunableOptions = ('inferenceSize', 'keyframeInterval', 'minTrackedRatio', 'smoothing',
+                      'minCutoff', 'beta', 'dCutoff', 'predict', 'maxPrediction')
+
+    def __init__(self, mode=False, maxHands=2, detectionCon=0.5, trackCon=0.5, inferenceSize=None,
+                 keyframeInterval=1, minTrackedRatio=0.8, smoothing=False, minCutoff=1.0, beta=0.007,
+                 dCutoff=1.0, predict=False, maxPrediction=0.1):
         self.results = None
         self.mode = mode
         self.maxHands = maxHands
         self.detectionCon = detectionCon
         self.trackCon = trackCon
+        # (width, height) to run MediaPipe at, e.g. (640, 360). None uses the full frame.
+        # Landmarks are normalized, so findPosition still returns full-frame pixels.
+        self.inferenceSize = inferenceSize
+
+        # Run MediaPipe only every keyframeInterval frames and track the landmarks with
+        # optical flow in between. 1 runs MediaPipe on every frame.
+        self.keyframeInterval = keyframeInterval
+        # Re-detect early when less than this share of a hand's points could be tracked
+        self.minTrackedRatio = minTrackedRatio
+        self.framesSinceKeyframe = 0
+        self.redetect = True
+        self.prevGray = None
+        self.inferenceCalls = 0
+        self.lkParams = dict(winSize=(21, 21), maxLevel=2,
+                             criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03))
+
+        # One Euro smoothing of the pixel landmarks, one filter per hand
+        self.smoothing = smoothing
+        self.minCutoff = minCutoff
+        self.beta = beta
+        self.dCutoff = dCutoff
+        self.filters = {}
+        self.timestamp = None
+
+        # (hands, 21, 3) landmark array for the current frame, built on first use
+        self.positions = None
+        self.labels = None
+        self.hand = None
+        self.lmList = []
+
+        # Hand key -> (normalized wrist, handedness) of the hands in the last frame, see handLabels()
+        self.tracks = {}
+        self.maxTrackDistance = 0.25  # Farther than this (in frame widths/heights) is another hand
+        self.sideMismatchCost = 0.05  # Added to the distance when the handedness differs
+
+        # Move predictIds forward by the measured capture-to-display latency (seconds),
+        # never further than maxPrediction. Needs smoothing for the velocity estimate.
+        self.predict = predict
+        self.maxPrediction = maxPrediction
+        self.predictIds = [8]  # Index fingertip
+        self.latency = 0.0
 
         self.mpHands = mp.solutions.hands
         self.hands = self.mpHands.Hands(
@@ -25,9 +115,56 @@ class handDetector:
         self.mpDraw = mp.solutions.drawing_utils
         self.tipIds = [4, 8, 12, 16, 20]
 
-    def findHands(self, img, draw=True):
-        imgRGB = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        self.results = self.hands.process(imgRGB)
+    def configure(self, **options):
+        """Change tunable options in place, e.g. configure(inferenceSize=(480, 270))"""
+        for name, value in options.items():
+            if name not in self.tunableOptions:
+                raise ValueError(f"{name} cannot be changed without creating a new handDetector")
+            setattr(self, name, value)
+        if {'minCutoff', 'beta', 'dCutoff'} & set(options):
+            self.filters.clear()  # Filters pick up the new parameters when they are recreated
+
+    def reset(self):
+        """Forget everything about the previous frames, e.g. before handing the detector to a new session"""
+        self.results = None
+        self.positions = None
+        self.labels = None
+        self.hand = None
+        self.lmList = []
+        self.tracks = {}
+        self.filters.clear()
+        self.prevGray = None
+        self.redetect = True
+        self.framesSinceKeyframe = 0
+        self.latency = 0.0
+
+    def warmup(self, shape=(720, 1280, 3)):
+        """Run one dummy frame so the model is loaded before the first real frame"""
+        self.findHands(np.zeros(shape, np.uint8), draw=False)
+        self.reset()
+
+    def findHands(self, img, draw=True, timestamp=None):
+        self.timestamp = time.monotonic() if timestamp is None else timestamp
+        self.positions = None
+        self.labels = None
+        imgSmall = img
+        if self.inferenceSize is not None:
+            w, h = self.inferenceSize
+            if w < img.shape[1] or h < img.shape[0]:
+                imgSmall = cv2.resize(img, (w, h), interpolation=cv2.INTER_AREA)
+
+        if self.keyframeInterval > 1:
+            gray = cv2.cvtColor(imgSmall, cv2.COLOR_BGR2GRAY)
+            if not self.needsKeyframe(gray) and self.trackHands(gray):
+                self.framesSinceKeyframe += 1
+            else:
+                self.detect(imgSmall)
+            self.prevGray = gray
+        else:
+            self.detect(imgSmall)
+
+        if not self.results.multi_hand_landmarks:
+            self.filters.clear()  # Start smoothing fresh when a hand comes back
 
         if self.results.multi_hand_landmarks:
             for handLms in self.results.multi_hand_landmarks:
@@ -36,36 +173,147 @@ class handDetector:
                                                self.mpHands.HAND_CONNECTIONS)
         return img
 
-    def findPosition(self, img, handNo=0, draw=True):
-        self.lmList = []
-        if self.results.multi_hand_landmarks:
-            myHand = self.results.multi_hand_landmarks[handNo]
-            for id, lm in enumerate(myHand.landmark):
-                h, w, c = img.shape
-                cx, cy = int(lm.x * w), int(lm.y * h)
-                self.lmList.append([id, cx, cy])
-                if draw:
-                    cv2.circle(img, (cx, cy), 10, (255, 0, 255), cv2.FILLED)
-        return self.lmList
+    def detect(self, imgSmall):
+        """Run the full MediaPipe graph"""
+        imgRGB = cv2.cvtColor(imgSmall, cv2.COLOR_BGR2RGB)
+        self.results = self.hands.process(imgRGB)
+        self.inferenceCalls += 1
+        self.framesSinceKeyframe = 0
+        self.redetect = False
 
-    def fingersUp(self):
-        fingers = []
+    def requestRedetect(self):
+        """Run the full MediaPipe graph on the next frame instead of tracking"""
+        self.redetect = True
 
-        # Thumb
-        if self.lmList[self.tipIds[0]][1] > self.lmList[self.tipIds[0] - 1][1]:
-            fingers.append(1)
-        else:
-            fingers.append(0)
+    def needsKeyframe(self, gray):
+        return (self.redetect
+                or self.results is None
+                or not self.results.multi_hand_landmarks  # Nothing to track, look for new hands
+                or self.prevGray is None
+                or self.prevGray.shape != gray.shape
+                or self.framesSinceKeyframe + 1 >= self.keyframeInterval)
+
+    def trackHands(self, gray):
+        """Move the last landmarks in self.results with optical flow; False if MediaPipe should run instead"""
+        h, w = gray.shape
+        hands = self.results.multi_hand_landmarks
+        landmarks = [lm for handLms in hands for lm in handLms.landmark]
+        prevPts = np.array([[lm.x * w, lm.y * h] for lm in landmarks], np.float32).reshape(-1, 1, 2)
+
+        nextPts, status, err = cv2.calcOpticalFlowPyrLK(self.prevGray, gray, prevPts, None, **self.lkParams)
+        status = status.reshape(-1).astype(bool)
+
+        # Every hand needs most of its points tracked, otherwise fall back to detection
+        if status.reshape(len(hands), -1).mean(axis=1).min() < self.minTrackedRatio:
+            return False
+
+        nextPts = nextPts.reshape(-1, 2)
+        for i, lm in enumerate(landmarks):
+            if status[i]:
+                lm.x = float(nextPts[i, 0] / w)
+                lm.y = float(nextPts[i, 1] / h)
+        return True
+
+    def reportLatency(self, seconds, weight=0.1):
+        """Feed in a measured capture-to-display latency; kept as a moving average"""
+        self.latency += weight * (seconds - self.latency)
+
+    def handLabels(self):
+        """Key of each detected hand, e.g. 'Right' or 'Right1', kept with its hand from frame to frame"""
+        if self.labels is None:
+            hands = (self.results.multi_hand_landmarks if self.results is not None else None) or []
+            handedness = (self.results.multi_handedness or []) if hands else []
+            sides = [handedness[i].classification[0].label if i < len(handedness) else 'Hand'
+                     for i in range(len(hands))]
+            wrists = [(handLms.landmark[0].x, handLms.landmark[0].y) for handLms in hands]
 
-        # 4 Fingers
-        for id in range(1, 5):
-            if self.lmList[self.tipIds[id]][2] < self.lmList[self.tipIds[id] - 2][2]:  # Compare y-coordinates
-                fingers.append(1)
+            # Closest pairs first; a different handedness only counts for a little
+            pairs = sorted(
+                (math.dist(wrist, trackWrist) + (self.sideMismatchCost if side != trackSide else 0.0), i, key)
+                for i, (wrist, side) in enumerate(zip(wrists, sides))
+                for key, (trackWrist, trackSide) in self.tracks.items())
+            self.labels = [None] * len(hands)
+            for cost, i, key in pairs:
+                if cost < self.maxTrackDistance and self.labels[i] is None and key not in self.labels:
+                    self.labels[i] = key
+            # New hands are keyed by their handedness, numbered if that key is taken
+            for i, side in enumerate(sides):
+                if self.labels[i] is None:
+                    key, n = side, 1
+                    while key in self.labels:
+                        key, n = f"{side}{n}", n + 1
+                    self.labels[i] = key
+
+            self.tracks = {key: (wrist, side) for key, wrist, side in zip(self.labels, wrists, sides)}
+            # Smoothing starts fresh for a hand that comes back
+            for key in list(self.filters):
+                if key not in self.tracks:
+                    del self.filters[key]
+        return self.labels
+
+    def filterPoints(self, handNo, points):
+        """Smooth one hand's (21, 2) pixel landmarks and extrapolate the prediction points"""
+        # Key the filter by the hand's key so it follows the hand if MediaPipe reorders them
+        key = self.handLabels()[handNo]
+        oneEuro = self.filters.get(key)
+        if oneEuro is None:
+            oneEuro = self.filters[key] = OneEuroFilter(self.minCutoff, self.beta, self.dCutoff)
+        points = oneEuro(points, self.timestamp)
+
+        if self.predict and self.latency > 0:
+            lead = min(self.latency, self.maxPrediction)
+            points[self.predictIds] += oneEuro.dx[self.predictIds] * lead
+        return points
+
+    def findPositionArray(self, img):
+        """All hands as a (hands, 21, 3) float32 array: x and y in pixels of img, MediaPipe's relative z"""
+        if self.positions is None:
+            hands = self.results.multi_hand_landmarks if self.results is not None else None
+            if not hands:
+                self.positions = np.zeros((0, 21, 3), np.float32)
             else:
-                fingers.append(0)
+                h, w = img.shape[:2]
+                positions = np.array([[(lm.x, lm.y, lm.z) for lm in handLms.landmark] for handLms in hands],
+                                     np.float32)
+                positions[:, :, 0] *= w
+                positions[:, :, 1] *= h
+                if self.smoothing:
+                    for handNo in range(len(positions)):
+                        positions[handNo, :, :2] = self.filterPoints(handNo, positions[handNo, :, :2])
+                self.positions = positions
+        return self.positions
 
+    def fingersUpArray(self, positions):
+        """(hands, 5) uint8 array, 1 where the finger is up, for a (hands, 21, 3) landmark array"""
+        fingers = np.empty((len(positions), 5), np.uint8)
+
+        # Thumb: tip to the right of the joint below it
+        fingers[:, 0] = positions[:, self.tipIds[0], 0] > positions[:, self.tipIds[0] - 1, 0]
+
+        # 4 Fingers: tip above the middle joint (compare y-coordinates)
+        tips = self.tipIds[1:]
+        joints = [tip - 2 for tip in tips]
+        fingers[:, 1:] = positions[:, tips, 1] < positions[:, joints, 1]
         return fingers
 
+    def findPosition(self, img, handNo=0, draw=True):
+        self.lmList = []
+        self.hand = None
+        positions = self.findPositionArray(img)
+        if handNo < len(positions):
+            self.hand = positions[handNo]
+            # int32 truncates toward zero like int() did
+            self.lmList = np.column_stack((np.arange(21), self.hand[:, :2].astype(np.int32))).tolist()
+            if draw:
+                for id, cx, cy in self.lmList:
+                    cv2.circle(img, (cx, cy), 10, (255, 0, 255), cv2.FILLED)
+        return self.lmList
+
+    def fingersUp(self):
+        """Finger states of the hand from the last findPosition call"""
+        # Use the integer pixels from lmList so ties resolve exactly as before
+        return self.fingersUpArray(np.array(self.lmList, np.int32)[np.newaxis, :, 1:])[0].tolist()
+
 
 def main():
     st.set_page_config(page_title="Hand Tracking App", page_icon="✋", layout="wide")
@@ -3,6 +3,10 @@ import time
 import cv2
 import numpy as np
 from collections import deque
+from PaintCanvas import PaintCanvas, intersects, union
+
+# Text object fields that affect how it is drawn
+TEXT_FIELDS = ('text', 'position', 'font', 'scale', 'color', 'thickness', 'selected')
 
 class KeyboardInput:
     def __init__(self):
@@ -27,6 +31,9 @@ class KeyboardInput:
         self.selected_object_index = -1  # Track selected text object
         self.text_history = []  # To store text object states for undo/redo
         self.history_index = -1
+        # Text objects pre-rendered with their mask, redrawn only where objects change
+        self.layer = PaintCanvas()
+        self.layer_keys = []
 
 
     def toggle_keyboard_mode(self):
@@ -122,25 +129,46 @@ class KeyboardInput:
 
     def draw(self, img):
         # Draw all existing text objects (always draw these)
-        for i, obj in enumerate(self.text_objects):
+        for obj in self.text_objects:
+            self.draw_object(img, obj)
+
+        # Only draw current input text and cursor if keyboard is active
+        if self.active:
+            self.draw_input(img)
+
+    def draw_cached(self, img):
+        """Same result as draw(), with the text objects copied from the cached text layer"""
+        self.update_layer()
+        self.layer.composite(img)
+        if self.active:
+            self.draw_input(img)
+
+    def draw_object(self, img, obj, offset=(0, 0), mask=None):
+        """Draw one text object, shifted by -offset; also paints its pixels into mask if given"""
+        position = (obj['position'][0] - offset[0], obj['position'][1] - offset[1])
+        targets = [(img, self.outline_color, obj['color'], (0, 255, 0))]
+        if mask is not None:
+            targets.append((mask, 255, 255, 255))
+
+        for target, outline_color, color, selection_color in targets:
             # Draw outline
             cv2.putText(
-                img,
+                target,
                 obj['text'],
-                obj['position'],
+                position,
                 obj['font'],
                 obj['scale'],
-                self.outline_color,
+                outline_color,
                 self.outline_thickness
             )
             # Draw main text
             cv2.putText(
-                img,
+                target,
                 obj['text'],
-                obj['position'],
+                position,
                 obj['font'],
                 obj['scale'],
-                obj['color'],
+                color,
                 obj['thickness']
             )
 
@@ -153,58 +181,103 @@ class KeyboardInput:
                     obj['thickness']
                 )[0]
                 top_left = (
-                    obj['position'][0] - 5,
-                    obj['position'][1] - text_size[1] - 5
+                    position[0] - 5,
+                    position[1] - text_size[1] - 5
                 )
                 bottom_right = (
-                    obj['position'][0] + text_size[0] + 5,
-                    obj['position'][1] + 5
+                    position[0] + text_size[0] + 5,
+                    position[1] + 5
                 )
-                cv2.rectangle(img, top_left, bottom_right, (0, 255, 0), 2)
-
-        # Only draw current input text and cursor if keyboard is active
-        if self.active:
-            # Draw outline
-            cv2.putText(
-                img,
+                cv2.rectangle(target, top_left, bottom_right, selection_color, 2)
+
+    def draw_input(self, img):
+        # Draw outline
+        cv2.putText(
+            img,
+            self.text,
+            self.current_input_position,
+            self.default_font,
+            self.default_scale,
+            self.outline_color,
+            self.outline_thickness
+        )
+
+        # Draw main text
+        cv2.putText(
+            img,
+            self.text,
+            self.current_input_position,
+            self.default_font,
+            self.default_scale,
+            self.default_color,
+            self.default_thickness
+        )
+
+        # Draw cursor if visible
+        if self.cursor_visible:
+            text_size = cv2.getTextSize(
                 self.text,
-                self.current_input_position,
                 self.default_font,
                 self.default_scale,
-                self.outline_color,
-                self.outline_thickness
+                self.default_thickness
+            )[0]
+            cursor_pos = (
+                self.current_input_position[0] + text_size[0],
+                self.current_input_position[1]
             )
-
-            # Draw main text
-            cv2.putText(
+            cv2.line(
                 img,
-                self.text,
-                self.current_input_position,
-                self.default_font,
-                self.default_scale,
-                self.default_color,
-                self.default_thickness
+                cursor_pos,
+                (cursor_pos[0], cursor_pos[1] - 30),
+                (255, 255, 255),  # White cursor
+                2
             )
 
-            # Draw cursor if visible
-            if self.cursor_visible:
-                text_size = cv2.getTextSize(
-                    self.text,
-                    self.default_font,
-                    self.default_scale,
-                    self.default_thickness
-                )[0]
-                cursor_pos = (
-                    self.current_input_position[0] + text_size[0],
-                    self.current_input_position[1]
-                )
-                cv2.line(
-                    img,
-                    cursor_pos,
-                    (cursor_pos[0], cursor_pos[1] - 30),
-                    (255, 255, 255),  # White cursor
-                    2
-                )
+    def object_rect(self, obj):
+        """(x0, y0, x1, y1) covering everything draw_object paints for obj"""
+        (w, h), baseline = cv2.getTextSize(
+            obj['text'], obj['font'], obj['scale'], max(obj['thickness'], self.outline_thickness))
+        x, y = obj['position']
+        margin = self.outline_thickness + 8  # Outline plus the selection rectangle
+        return (x - margin, y - h - margin, x + w + margin, y + baseline + margin)
+
+    def update_layer(self):
+        """Redraw only the regions of the text layer whose text objects changed"""
+        keys = [tuple(obj[field] for field in TEXT_FIELDS) for obj in self.text_objects]
+        if keys == self.layer_keys:
+            return
+
+        changed = set(keys) ^ set(self.layer_keys)
+        if not changed:
+            changed = set(keys)  # Same objects in a new order: stacking may differ anywhere
+        rects = [self.object_rect(dict(zip(TEXT_FIELDS, key))) for key in changed]
+        self.layer_keys = keys
+
+        for rect in rects:
+            rect = self.layer.clip(rect)
+            if rect is None:
+                continue
+            objects = [obj for obj in self.text_objects if intersects(rect, self.object_rect(obj))]
+
+            # Draw whole objects into a scratch area and keep only rect: clipping a glyph
+            # at the rect border would rasterize it slightly differently from draw()
+            area = rect
+            for obj in objects:
+                area = union(area, self.object_rect(obj))
+            area = self.layer.clip(area)
+            image = np.zeros((area[3] - area[1], area[2] - area[0], 3), np.uint8)
+            mask = np.zeros(image.shape[:2], np.uint8)
+            for obj in objects:
+                self.draw_object(image, obj, offset=area[:2], mask=mask)
+
+            x0, y0, x1, y1 = rect[0] - area[0], rect[1] - area[1], rect[2] - area[0], rect[3] - area[1]
+            layer_image, layer_mask = self.layer.region(rect)
+            layer_image[:] = image[y0:y1, x0:x1]
+            layer_mask[:] = mask[y0:y1, x0:x1]
+            self.layer.mark_dirty(rect)
+
+        if not self.text_objects:
+            self.layer.bounds = None
 
     def check_drag_start(self, x, y):
         # First check if we're selecting existing text objects
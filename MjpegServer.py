@@ -0,0 +1,135 @@
+# MjpegServer.py
+import threading
+import weakref
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BOUNDARY = b"frame"
+
+
+class MjpegStream:
+    """The latest JPEG frame of one painter, shared by all of its viewers"""
+
+    def __init__(self, server, key):
+        self.server = server
+        self.key = key
+        self.frame = None
+        self.frame_id = 0
+        self.condition = threading.Condition()
+        self.closed = False
+        self.viewers = 0
+
+    @property
+    def url(self):
+        return f"http://{self.server.public_host}:{self.server.port}/stream/{self.key}.mjpg"
+
+    def publish(self, jpeg):
+        """Make jpeg (bytes) the current frame; every viewer gets these same bytes"""
+        with self.condition:
+            self.frame = jpeg
+            self.frame_id += 1
+            self.condition.notify_all()
+
+    def wait(self, last_id, timeout):
+        """Next frame after last_id as (frame_id, jpeg), or None if the stream closed or stalled"""
+        with self.condition:
+            self.condition.wait_for(lambda: self.frame_id != last_id or self.closed, timeout)
+            if self.closed or self.frame_id == last_id:
+                return None
+            return self.frame_id, self.frame
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.server.remove(self)
+
+
+class MjpegStreamLease:
+    """Keeps a stream open while its holder (e.g. a session's state) keeps the lease
+
+    The stream is closed when the lease is released or garbage collected.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.finalizer = weakref.finalize(self, stream.close)
+
+    def release(self):
+        self.finalizer()
+
+
+class MjpegHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        key = self.path.removeprefix("/stream/").removesuffix(".mjpg")
+        stream = self.server.owner.streams.get(key)
+        if stream is None:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY.decode()}")
+        self.send_header("Cache-Control", "no-cache, private")
+        self.send_header("Pragma", "no-cache")
+        self.end_headers()
+
+        with stream.condition:
+            stream.viewers += 1
+        last_id = 0  # Start with the current frame, if there is one
+        try:
+            while True:
+                frame = stream.wait(last_id, self.server.owner.idle_timeout)
+                if frame is None:
+                    break
+                last_id, jpeg = frame
+                self.wfile.write(b"--" + BOUNDARY + b"\r\nContent-Type: image/jpeg\r\n"
+                                 + f"Content-Length: {len(jpeg)}\r\n\r\n".encode() + jpeg + b"\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Viewer went away
+        finally:
+            with stream.condition:
+                stream.viewers -= 1
+
+    def log_message(self, format, *args):
+        pass  # One request per viewer, no need to log them
+
+
+class MjpegServer:
+    """Local HTTP server that streams painter frames as MJPEG (multipart JPEG)
+
+    Each painter publishes its already encoded frames to its own stream, and
+    any number of viewers (e.g. an <img> on the page) read them from
+    /stream/<key>.mjpg without anything being encoded per viewer. Viewers that
+    see no new frame for idle_timeout seconds are disconnected.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, public_host='localhost', idle_timeout=30.0):
+        self.public_host = public_host
+        self.idle_timeout = idle_timeout
+        self.streams = {}
+        self.lock = threading.Lock()
+
+        self.httpd = ThreadingHTTPServer((host, port), MjpegHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.owner = self
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="MjpegServer", daemon=True)
+        self.thread.start()
+
+    def stream(self, key):
+        """The stream for key, created on first use"""
+        with self.lock:
+            stream = self.streams.get(key)
+            if stream is None or stream.closed:
+                stream = self.streams[key] = MjpegStream(self, key)
+            return stream
+
+    def remove(self, stream):
+        with self.lock:
+            if self.streams.get(stream.key) is stream:
+                del self.streams[stream.key]
+
+    def shutdown(self):
+        for stream in list(self.streams.values()):
+            stream.close()
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,106 @@
+# PaintCanvas.py
+import cv2
+import numpy as np
+
+
+def union(a, b):
+    """Smallest (x0, y0, x1, y1) rect containing both; either may be None"""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
+def intersects(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def channel_max(img):
+    """Largest channel value of every pixel (much faster than img.max(axis=2))"""
+    b, g, r = cv2.split(img)
+    return cv2.max(cv2.max(b, g), r)
+
+
+class PaintCanvas:
+    """The drawing canvas plus a mask of its painted pixels, kept up to date as it is drawn on
+
+    Every write goes through polyline(), restore() or region(), so the mask
+    is only updated inside the (x0, y0, x1, y1) rect each write changed, never
+    recomputed from the whole canvas. Compositing is a single masked copy of the
+    bounding rect of everything painted so far.
+    """
+
+    def __init__(self, width=1280, height=720):
+        self.width = width
+        self.height = height
+        self.image = np.zeros((height, width, 3), np.uint8)
+        self.mask = np.zeros((height, width), np.uint8)  # 255 where the canvas has paint
+        self.bounds = None  # Bounding rect of all painted pixels (may be larger after erasing)
+
+    def clip(self, rect):
+        x0, y0, x1, y1 = rect
+        x0, y0 = max(0, x0), max(0, y0)
+        x1, y1 = min(self.width, x1), min(self.height, y1)
+        if x0 >= x1 or y0 >= y1:
+            return None
+        return (x0, y0, x1, y1)
+
+    def mark_dirty(self, rect, painted=True):
+        """Clip a changed rect and grow bounds by it if paint was added there; returns the clipped rect"""
+        rect = self.clip(rect)
+        if rect is not None and painted:
+            self.bounds = union(self.bounds, rect)
+        return rect
+
+    def polyline(self, points, color, thickness):
+        """Draw an (n, 2) int32 array of points in one call"""
+        if len(points) == 1:
+            points = np.repeat(points, 2, axis=0)  # A dot, drawn as a zero-length segment
+        cv2.polylines(self.image, [points], False, color, thickness)
+        # Black is the eraser, it clears the mask along with the paint
+        erase = color == (0, 0, 0)
+        cv2.polylines(self.mask, [points], False, 0 if erase else 255, thickness)
+
+        r = thickness // 2 + 2
+        (x0, y0), (x1, y1) = points.min(axis=0).tolist(), points.max(axis=0).tolist()
+        self.mark_dirty((x0 - r, y0 - r, x1 + r + 1, y1 + r + 1), painted=not erase)
+
+    def region(self, rect):
+        """Image and mask views of rect, for drawing a region directly (call mark_dirty after)"""
+        x0, y0, x1, y1 = rect
+        return self.image[y0:y1, x0:x1], self.mask[y0:y1, x0:x1]
+
+    def restore(self, image, rects=None):
+        """Copy rects (default: the bounding box of what differs) of image onto the canvas, e.g. for undo/redo"""
+        if rects is None:
+            changed = cv2.findNonZero(channel_max(cv2.absdiff(self.image, image)))
+            if changed is None:
+                return
+            x, y, w, h = cv2.boundingRect(changed)
+            rects = [(x, y, x + w, y + h)]
+        for rect in rects:
+            x0, y0, x1, y1 = rect
+            self.image[y0:y1, x0:x1] = image[y0:y1, x0:x1]
+            self.update_mask(rect)
+
+        # Paint may have appeared or disappeared anywhere in the rects, so measure it again
+        painted = cv2.findNonZero(self.mask)
+        if painted is None:
+            self.bounds = None
+        else:
+            x, y, w, h = cv2.boundingRect(painted)
+            self.bounds = (x, y, x + w, y + h)
+
+    def update_mask(self, rect):
+        x0, y0, x1, y1 = rect
+        painted = channel_max(self.image[y0:y1, x0:x1])
+        self.mask[y0:y1, x0:x1] = cv2.threshold(painted, 0, 255, cv2.THRESH_BINARY)[1]
+
+    def composite(self, img):
+        """Copy the painted pixels onto img in place"""
+        if self.bounds is not None:
+            x0, y0, x1, y1 = self.bounds
+            roi = img[y0:y1, x0:x1]
+            cv2.copyTo(self.image[y0:y1, x0:x1], self.mask[y0:y1, x0:x1], roi)
+        return img
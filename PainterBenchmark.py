@@ -0,0 +1,234 @@
+# PainterBenchmark.py
+"""Headless painter benchmark: replay a video file or image folder through the painter as fast as possible
+
+    python PainterBenchmark.py recording.mp4
+    python PainterBenchmark.py frames/ --record-trace hands.npz
+    python PainterBenchmark.py frames/ --trace hands.npz --csv timings.csv
+    python PainterBenchmark.py frames/ --trace traces/session_20240101_120000.bttrace
+
+Frames go through the same detect, gesture, drawing, compositing and encode
+code as the Streamlit pages. With --trace, landmarks come from a trace
+recorded earlier with --record-trace (or a session trace recorded by the
+pages) and MediaPipe is not run at all, which isolates the painter's own costs.
+"""
+import argparse
+import itertools
+import os
+import sys
+import time
+import cv2
+import numpy as np
+import HandTrackingModule as htm
+from AssetStore import AssetStore
+from DetectionWorker import create_detector
+from PainterEngine import PainterEngine, FramePacket
+from StageProfiler import StageProfiler
+from SessionTrace import read_trace
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+FRAME_SIZE = (1280, 720)  # What the pages ask the camera for
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.webp')
+
+
+def read_frames(source, size=FRAME_SIZE):
+    """BGR frames of a video file or of the images in a folder (in file name order), resized to size"""
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                img = cv2.imread(os.path.join(source, name))
+                if img is not None:
+                    yield img if (img.shape[1], img.shape[0]) == size else cv2.resize(img, size)
+        return
+
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise OSError(f"cannot open {source}")
+    try:
+        while True:
+            success, img = cap.read()
+            if not success:
+                break
+            yield img if (img.shape[1], img.shape[0]) == size else cv2.resize(img, size)
+    finally:
+        cap.release()
+
+
+class TraceDetector:
+    """Replays landmarks recorded by TraceRecorder (.npz) or a SessionTrace instead of running hand detection
+
+    Frame i of the replay gets the hands recorded for frame i, so the painter
+    sees exactly the gestures of the recorded run. Session traces keep only
+    the landmark pixels, so their depth is replayed as 0.
+    """
+
+    tipIds = [4, 8, 12, 16, 20]
+    fingersUpArray = htm.handDetector.fingersUpArray
+
+    def __init__(self, path):
+        if path.endswith('.npz'):
+            trace = np.load(path)
+            self.counts = trace['counts']  # Hands per frame
+            self.positions = trace['positions']  # (total hands, 21, 3)
+            self.labels = trace['labels']  # Label per hand
+        else:
+            frames = list(read_trace(path))
+            self.counts = np.array([len(frame.labels) for frame in frames], np.int32)
+            points = [frame.points for frame in frames if len(frame.points)]
+            points = np.concatenate(points) if points else np.zeros((0, 21, 2), np.int32)
+            self.positions = np.concatenate([points, np.zeros(points.shape[:2] + (1,), np.int32)], axis=2)
+            self.labels = np.array([label for frame in frames for label in frame.labels], dtype='U8')
+        self.offsets = np.concatenate([[0], np.cumsum(self.counts)])
+        self.frame = -1
+
+    def __len__(self):
+        return len(self.counts)
+
+    def findHands(self, img, draw=True, timestamp=None):
+        self.frame += 1
+        return img
+
+    def findPositionArray(self, img):
+        if self.frame >= len(self.counts):
+            return np.zeros((0, 21, 3), np.float32)
+        start, end = self.offsets[self.frame], self.offsets[self.frame + 1]
+        return self.positions[start:end]
+
+    def handLabels(self):
+        if self.frame >= len(self.counts):
+            return []
+        start, end = self.offsets[self.frame], self.offsets[self.frame + 1]
+        return [str(label) for label in self.labels[start:end]]
+
+    def reportLatency(self, seconds, weight=0.1):
+        pass
+
+    def configure(self, **options):
+        pass
+
+
+class TraceRecorder:
+    """Wraps a detector and keeps the landmarks it finds, for saving as a trace"""
+
+    def __init__(self, detector):
+        self.detector = detector
+        self.counts = []
+        self.positions = []
+        self.labels = []
+
+    def __getattr__(self, name):
+        return getattr(self.detector, name)
+
+    def findPositionArray(self, img):
+        positions = self.detector.findPositionArray(img)
+        labels = self.detector.handLabels()
+        self.counts.append(len(positions))
+        self.positions.append(np.asarray(positions, np.float32))
+        self.labels.extend(labels)
+        return positions
+
+    def save(self, path):
+        positions = np.concatenate(self.positions) if self.positions else np.zeros((0, 21, 3), np.float32)
+        np.savez_compressed(path, counts=np.array(self.counts, np.int32), positions=positions,
+                            labels=np.array(self.labels, dtype='U8'))
+
+
+def peak_memory_mb():
+    """Peak resident memory of this process in MB, or None where it cannot be measured"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_benchmark(frames, detector, warmup=10, max_frames=None, profiler=None):
+    """Run frames through a PainterEngine as fast as possible; returns (frames timed, seconds, profiler)
+
+    The first warmup frames are processed but not timed.
+    """
+    assets = AssetStore()
+    engine = PainterEngine(detector, assets.headers, assets.guides, use_keyboard=False)
+    profiler = profiler or StageProfiler(size=100000)
+
+    count = 0
+    start = None
+    frames = iter(frames)
+    for i in itertools.count():
+        if max_frames is not None and i >= max_frames:
+            break
+        if i == warmup:
+            start = time.perf_counter()
+
+        # Reading and decoding the source stands in for the camera
+        read_start = time.perf_counter()
+        img = next(frames, None)
+        if img is None:
+            break
+        packet = FramePacket(img, time.monotonic(), i)
+        packet.add_time('capture', read_start)
+
+        packet = engine.process(packet)
+        if i >= warmup:
+            profiler.record(packet.timings)
+            count += 1
+    elapsed = time.perf_counter() - start if start is not None else 0.0
+    engine.saver.executor.shutdown(wait=True)
+    return count, elapsed, profiler
+
+
+def parse_size(text):
+    if text in (None, 'full'):
+        return None
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('source', help="video file or folder of images")
+    parser.add_argument('--trace', help="replay landmarks from this trace instead of running MediaPipe")
+    parser.add_argument('--record-trace', help="save the detected landmarks as a trace to this .npz file")
+    parser.add_argument('--backend', default='in-process', choices=['in-process', 'process'])
+    parser.add_argument('--inference-size', default='640x360', help="WxH, or 'full'")
+    parser.add_argument('--keyframe-interval', type=int, default=1)
+    parser.add_argument('--frames', type=int, help="stop after this many frames")
+    parser.add_argument('--warmup', type=int, default=10, help="frames processed before timing starts")
+    parser.add_argument('--csv', help="write the per-frame stage timings to this CSV file")
+    args = parser.parse_args(argv)
+
+    if args.trace:
+        detector = TraceDetector(args.trace)
+    else:
+        detector = create_detector(args.backend, detectionCon=0.85, inferenceSize=parse_size(args.inference_size),
+                                   keyframeInterval=args.keyframe_interval)
+        if args.record_trace:
+            detector = TraceRecorder(detector)
+
+    try:
+        count, elapsed, profiler = run_benchmark(read_frames(args.source), detector, args.warmup, args.frames)
+    finally:
+        if hasattr(detector, 'close'):
+            detector.close()  # Stops a worker process
+
+    if args.record_trace and not args.trace:
+        detector.save(args.record_trace)
+        print(f"Trace of {len(detector.counts)} frames saved to {args.record_trace}")
+    if args.csv:
+        with open(args.csv, 'w') as f:
+            f.write(profiler.to_csv())
+
+    mode = "landmark trace" if args.trace else f"{args.backend} detection"
+    fps = count / elapsed if elapsed else 0.0
+    print(f"{count} frames in {elapsed:.2f} s: {fps:.1f} fps ({mode})")
+    print("\n".join(profiler.table()))
+    peak = peak_memory_mb()
+    if peak is not None:
+        print(f"Peak memory: {peak:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
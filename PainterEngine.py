@@ -0,0 +1,620 @@
+# PainterEngine.py
+import time
+import cv2
+import numpy as np
+import keyboard
+from collections import deque
+from KeyboardInput import KeyboardInput
+from PaintCanvas import PaintCanvas, channel_max
+from UndoHistory import UndoHistory
+from CanvasSaver import CanvasSaver
+
+
+# Function to interpolate points
+def interpolate_points(x1, y1, x2, y2, num_points=10):
+    """(num_points, 2) int32 array of points from (x1, y1) towards (x2, y2), which is not included"""
+    t = np.arange(num_points) / num_points
+    # int32 truncates toward zero like int() did
+    return np.column_stack((x1 + (x2 - x1) * t, y1 + (y2 - y1) * t)).astype(np.int32)
+
+
+def catmull_rom(p0, p1, p2, p3, num_points=10):
+    """(num_points + 1, 2) int32 array of points on the Catmull-Rom spline from p1 to p2, both included
+
+    p0 and p3 are the points before and after the segment that shape its curve.
+    """
+    p0, p1, p2, p3 = (np.asarray(p, np.float64) for p in (p0, p1, p2, p3))
+    t = (np.arange(num_points + 1) / num_points)[:, np.newaxis]
+    points = 0.5 * (2 * p1 + (p2 - p0) * t + (2 * p0 - 5 * p1 + 4 * p2 - p3) * t ** 2
+                    + (3 * p1 - p0 - 3 * p2 + p3) * t ** 3)
+    return np.rint(points).astype(np.int32)
+
+
+class FramePacket:
+    """One camera frame and everything computed for it on its way through the stages"""
+
+    def __init__(self, img, timestamp=None, index=0):
+        self.img = img
+        self.timestamp = time.monotonic() if timestamp is None else timestamp
+        self.index = index
+        self.labels = []  # Handedness per hand
+        self.points = np.zeros((0, 21, 2), np.int32)  # Landmark pixels per hand
+        self.fingers = np.zeros((0, 5), np.uint8)  # Finger states per hand
+        self.actions = []  # (kind, label, args) of the header buttons pressed and segments drawn
+        self.output = None  # Encoded JPEG bytes
+        self.timings = {}  # Seconds spent in each stage
+
+    def add_time(self, stage, start):
+        """Add the time since start (a time.perf_counter()) to stage and return the current time"""
+        now = time.perf_counter()
+        self.timings[stage] = self.timings.get(stage, 0.0) + now - start
+        return now
+
+
+class HandState:
+    """Painter state that belongs to one hand"""
+
+    def __init__(self, drawColor=(255, 0, 255), brushSize=10, eraserSize=100):
+        # Default drawing color and sizes
+        self.drawColor = drawColor
+        self.brushSize = brushSize
+        self.eraserSize = eraserSize
+
+        # Previous points
+        self.xp, self.yp = 0, 0
+        self.trail = []  # Last fingertip points of the current stroke, for spline strokes
+
+        # Gesture state this frame: drawing a stroke, and the header button under the finger
+        self.drawing = False
+        self.header_button = None
+
+        # Swipe detection variables
+        self.swipe_start_x = None  # To track where swipe started
+        self.swipe_active = False  # To track if swipe is in progress
+
+
+class PainterEngine:
+    """Painter state and the per-frame stages: detect -> update -> compose -> encode
+
+    The stages only touch Streamlit through self.notifications, so they can run
+    on worker threads or outside Streamlit entirely. update() and compose() must
+    be called from one thread in frame order since they share the painter state.
+    """
+
+    def __init__(self, detector, overlayList, guideList, use_keyboard=True, undo_budget=64 * 1024 * 1024,
+                 save_format='png', save_level=3, output_quality=80, output_scale=1.0, spline_strokes=False):
+        self.detector = detector
+        self.overlayList = overlayList
+        self.guideList = guideList
+        self.use_keyboard = use_keyboard
+
+        # Default images
+        self.header = overlayList[0]
+        self.current_guide_index = 0  # Track current guide index
+        self.current_guide = None  # Initially no guide shown
+        self.show_guide = False  # Track guide visibility state
+
+        # Minimum horizontal movement to consider a swipe
+        self.swipe_threshold = 50
+
+        # Draw strokes as Catmull-Rom splines through the fingertip points instead of straight segments
+        self.spline_strokes = spline_strokes
+
+        # Drawing state per hand, keyed by the detector's hand keys (which follow each hand),
+        # so two people can paint at once
+        self.hands = {}
+        self.drag_hand = None  # Hand that is dragging text
+
+        # Create Image Canvas
+        self.canvas = PaintCanvas(1280, 720)
+
+        # Undo/Redo history of both canvas and text, as vector strokes with raster checkpoints
+        self.history = UndoHistory(self.canvas, budget=undo_budget)
+
+        # Create keyboard input handler
+        self.keyboard_input = KeyboardInput()
+        self.last_time = time.time()
+
+        # (kind, message) pairs for the page to show with st.success / st.toast
+        self.notifications = deque()
+
+        # Writes saved paintings off the frame loop and reports back through notify()
+        self.saver = CanvasSaver(self.notify, format=save_format, level=save_level)
+
+        # JPEG quality and scale of the displayed frames
+        self.output_quality = output_quality
+        self.output_scale = output_scale
+        self.scaled = None  # Reused buffer for the downscaled frame
+
+        # Blend the guide with the camera, or (cheaper) only add it over its drawn part
+        self.guide_blend = True
+        self.guide_overlays = {}  # Guide index -> (rect, dimmed pixels) for the cheap mode
+
+        # Extra draw(img) callables applied last in compose()
+        self.overlays = []
+
+        # SessionTrace.TraceWriter that every updated frame is logged to, if any
+        self.recorder = None
+        self.actions = []  # The current frame's packet.actions
+
+    def notify(self, kind, message):
+        self.notifications.append((kind, message))
+
+    def pop_notifications(self):
+        while self.notifications:
+            yield self.notifications.popleft()
+
+    def handle_keyboard_events(self):
+        keyboard_input = self.keyboard_input
+        if keyboard_input.active:
+            if keyboard.is_pressed('enter'):
+                keyboard_input.process_key_input(13)  # Enter key
+            elif keyboard.is_pressed('backspace'):
+                keyboard_input.process_key_input(8)  # Backspace
+            elif keyboard.is_pressed('esc'):
+                keyboard_input.active = False
+            elif keyboard.is_pressed('caps lock'):
+                # Toggle caps lock state
+                keyboard_input.caps_lock = not getattr(keyboard_input, 'caps_lock', False)
+            else:
+                shift_pressed = keyboard.is_pressed('shift')
+                caps_lock_active = getattr(keyboard_input, 'caps_lock', False)
+
+                # First check numbers (they shouldn't be affected by caps lock)
+                for num in '0123456789':
+                    if keyboard.is_pressed(num):
+                        if shift_pressed:
+                            # Shift + number gives the special character
+                            shift_num_map = {
+                                '1': '!', '2': '@', '3': '#', '4': '$', '5': '%',
+                                '6': '^', '7': '&', '8': '*', '9': '(', '0': ')'
+                            }
+                            char = shift_num_map[num]
+                            keyboard_input.process_key_input(ord(char))
+                        else:
+                            # Regular number
+                            keyboard_input.process_key_input(ord(num))
+                        return
+
+                # Then check letters (affected by both shift and caps lock)
+                for letter in 'abcdefghijklmnopqrstuvwxyz':
+                    if keyboard.is_pressed(letter):
+                        if shift_pressed ^ caps_lock_active:  # XOR - uppercase if either is true
+                            keyboard_input.process_key_input(ord(letter.upper()))
+                        else:
+                            keyboard_input.process_key_input(ord(letter.lower()))
+                        return
+
+                # Then check other special characters (space, punctuation, etc.)
+                special_chars = {
+                    'space': ' ',
+                    'tab': '\t',
+                    '-': '-', '=': '=',
+                    '[': '[', ']': ']', '\\': '\\',
+                    ';': ';', "'": "'",
+                    ',': ',', '.': '.', '/': '/',
+                    '`': '`'
+                }
+
+                # Shifted versions of special characters
+                shifted_special_chars = {
+                    '-': '_', '=': '+',
+                    '[': '{', ']': '}', '\\': '|',
+                    ';': ':', "'": '"',
+                    ',': '<', '.': '>', '/': '?',
+                    '`': '~'
+                }
+
+                for char in special_chars:
+                    if keyboard.is_pressed(char):
+                        if shift_pressed and char in shifted_special_chars:
+                            keyboard_input.process_key_input(ord(shifted_special_chars[char]))
+                        else:
+                            keyboard_input.process_key_input(ord(special_chars[char]))
+                        return
+
+    def save_canvas(self):
+        """Hand the canvas, text and strokes to the background saver"""
+        self.saver.save(self.canvas.image, self.keyboard_input.text_objects, self.history.strokes())
+
+    def detect(self, packet):
+        """Flip the frame and find landmarks, hand keys and finger states of every hand"""
+        start = time.perf_counter()
+        packet.img = cv2.flip(packet.img, 1)
+        start = packet.add_time('flip', start)
+
+        # Find Hand Landmarks
+        packet.img = self.detector.findHands(packet.img, draw=False, timestamp=packet.timestamp)
+        start = packet.add_time('findHands', start)
+        positions = self.detector.findPositionArray(packet.img)
+        packet.labels = self.detector.handLabels()
+        packet.points = positions[:, :, :2].astype(np.int32)
+        packet.fingers = self.detector.fingersUpArray(packet.points)
+        packet.add_time('landmarks', start)
+        return packet
+
+    def update(self, packet):
+        """Apply the gestures of every hand in this frame to the painter state and draw feedback"""
+        start = time.perf_counter()
+        img = packet.img
+        keyboard_input = self.keyboard_input
+        self.actions = packet.actions
+
+        # Draw black outline (thicker)
+        cv2.putText(img, "Selection Mode - Two Fingers Up", (50, 150),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 0), 4)  # Black with thickness 4
+
+        # Draw main white text (thinner)
+        cv2.putText(img, "Selection Mode - Two Fingers Up", (50, 150),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)  # White with thickness 2
+
+        for label, points, fingers in zip(packet.labels, packet.points, packet.fingers):
+            hand = self.hands.get(label)
+            if hand is None:
+                hand = self.hands[label] = HandState()
+            self.update_hand(img, label, hand, points, fingers)
+
+        # Hands that left the frame: reset their swipe and release a drag they owned
+        for label, hand in self.hands.items():
+            if label not in packet.labels:
+                hand.swipe_start_x = None
+                hand.swipe_active = False
+                if keyboard_input.dragging and self.drag_hand == label:
+                    keyboard_input.end_drag()
+
+        # A stroke is one transaction from the moment drawing starts until the hand stops
+        # drawing (or changes mode, or leaves), and a text drag lasts until it is dropped
+        for label, hand in self.hands.items():
+            if hand.drawing and label in packet.labels:
+                self.history.begin(label)
+            else:
+                self.history.end(label)
+        if keyboard_input.dragging:
+            self.history.begin('drag')
+        else:
+            self.history.end('drag')
+
+        # Record one undo entry once every open stroke and drag has ended (a no-op if nothing changed)
+        self.history.commit(keyboard_input.text_objects)
+
+        # Handle keyboard input
+        if self.use_keyboard:
+            self.handle_keyboard_events()
+        current_time = time.time()
+        dt = current_time - self.last_time
+        self.last_time = current_time
+        keyboard_input.update(dt)
+
+        if self.recorder is not None:
+            self.recorder.record(packet)
+        packet.add_time('gestures', start)
+        return packet
+
+    def update_hand(self, img, label, hand, points, fingers):
+        keyboard_input = self.keyboard_input
+
+        # Tip of index and middle fingers
+        x1, y1 = points[8].tolist()
+        x2, y2 = points[12].tolist()
+
+        hand.drawing = False
+        pressed = None
+
+        # Selection Mode - Two Fingers Up
+        if fingers[1] and fingers[2]:
+            hand.xp, hand.yp = 0, 0  # Reset points
+            hand.swipe_start_x = None  # Reset swipe tracking when in selection mode
+
+            # Detecting selection based on X coordinate
+            if y1 < 125:  # Ensure the selection is within the header area
+                pressed = self.select_header_item(hand, x1, y1)
+
+            # Show selection rectangle
+            cv2.rectangle(img, (x1, y1 - 25), (x2, y2 + 25), hand.drawColor, cv2.FILLED)
+
+        # ==================== HAND GESTURE LOGIC ====================
+        # GUIDE NAVIGATION MODE - One index finger, guide visible, keyboard not active
+        if fingers[1] and not fingers[2] and self.show_guide and not keyboard_input.active:
+            # Start or continue swipe gesture
+            if hand.swipe_start_x is None:
+                hand.swipe_start_x = x1
+                hand.swipe_active = True
+            else:
+                delta_x = x1 - hand.swipe_start_x
+                if abs(delta_x) > self.swipe_threshold and hand.swipe_active:
+                    if delta_x > 0:
+                        # Swipe right - previous guide
+                        self.current_guide_index = max(0, self.current_guide_index - 1)
+                    else:
+                        # Swipe left - next guide
+                        self.current_guide_index = min(len(self.guideList) - 1, self.current_guide_index + 1)
+
+                    self.current_guide = self.guideList[self.current_guide_index]
+                    self.notify('toast', f"Guide {self.current_guide_index + 1}/{len(self.guideList)}")
+                    hand.swipe_active = False  # avoid rapid multiple swipes
+
+            # Visual feedback
+            cv2.circle(img, (x1, y1), 15, (0, 255, 0), cv2.FILLED)
+
+        # DRAWING MODE - One index finger, guide hidden, keyboard not active
+        elif fingers[1] and not fingers[2] and not self.show_guide and not keyboard_input.active:
+            hand.swipe_start_x = None  # cancel swipe tracking when drawing
+
+            # Eraser: Check for overlapping with existing text
+            if hand.drawColor == (0, 0, 0):
+                self.erase_text_at(x1, y1)
+
+            # Visual feedback
+            cv2.circle(img, (x1, y1), 15, hand.drawColor, cv2.FILLED)
+
+            if hand.xp == 0 and hand.yp == 0:
+                hand.xp, hand.yp = x1, y1
+
+            # Smooth drawing
+            self.draw_stroke(label, hand, x1, y1)
+            hand.drawing = True
+
+        # TEXT DRAGGING MODE - Two fingers, keyboard active
+        elif keyboard_input.active and fingers[1] and fingers[2]:
+            center_x = (x1 + x2) // 2
+            center_y = (y1 + y2) // 2
+
+            if not keyboard_input.dragging:
+                if keyboard_input.text or keyboard_input.cursor_visible:
+                    if keyboard_input.check_drag_start(center_x, center_y):
+                        self.drag_hand = label
+            elif self.drag_hand == label:
+                keyboard_input.update_drag(center_x, center_y)
+
+            # Visual feedback
+            cv2.circle(img, (center_x, center_y), 15, (0, 255, 255), cv2.FILLED)
+
+        else:
+            # Reset states when fingers not up or mode not active
+            hand.xp, hand.yp = 0, 0
+            hand.swipe_start_x = None
+            hand.swipe_active = False
+            if keyboard_input.dragging and self.drag_hand == label:
+                keyboard_input.end_drag()
+
+        if pressed is not None and pressed != hand.header_button:
+            self.actions.append(('select', label, (pressed,)))
+        hand.header_button = pressed
+
+    def select_header_item(self, hand, x1, y1):
+        """Apply the header button at (x1, y1) and return its name; Save, Undo and Redo act once per press"""
+        keyboard_input = self.keyboard_input
+        overlayList = self.overlayList
+
+        if 0 < x1 < 128:  # Save, once per press
+            self.header = overlayList[1]
+            if hand.header_button != 'save':
+                self.save_canvas()
+            self.show_guide = False
+            return 'save'
+
+        elif 128 < x1 < 256:  # Pink
+            self.header = overlayList[2]
+            hand.drawColor = (255, 0, 255)  # Pink
+            self.show_guide = False
+            keyboard_input.active = False  # Close keyboard input if open
+            return 'pink'
+
+        elif 256 < x1 < 384:  # Blue
+            self.header = overlayList[3]
+            hand.drawColor = (255, 0, 0)  # Blue
+            self.show_guide = False
+            keyboard_input.active = False  # Close keyboard input if open
+            return 'blue'
+
+        elif 384 < x1 < 512:  # Green
+            self.header = overlayList[4]
+            hand.drawColor = (0, 255, 0)  # Green
+            self.show_guide = False
+            keyboard_input.active = False  # Close keyboard input if open
+            return 'green'
+
+        elif 512 < x1 < 640:  # Yellow
+            self.header = overlayList[5]
+            hand.drawColor = (0, 255, 255)  # Yellow
+            self.show_guide = False
+            keyboard_input.active = False  # Close keyboard input if open
+            return 'yellow'
+
+        elif 640 < x1 < 768:  # Eraser
+            self.header = overlayList[6]
+            hand.drawColor = (0, 0, 0)  # Eraser
+            self.show_guide = False
+            keyboard_input.active = False  # Close keyboard input if open
+            # Delete selected text if any
+            keyboard_input.delete_selected()
+            return 'eraser'
+
+        # Undo/Redo handling
+        # Undo/Redo step once per press, not once per frame while the finger hovers
+        elif 768 < x1 < 896:  # Undo
+            self.header = overlayList[7]
+            if hand.header_button != 'undo':
+                text_objects = self.history.undo(keyboard_input.text_objects)
+                if text_objects is not None:
+                    keyboard_input.text_objects = deque(text_objects, maxlen=20)
+                    self.show_guide = False
+            return 'undo'
+
+        elif 896 < x1 < 1024:  # Redo
+            self.header = overlayList[8]
+            if hand.header_button != 'redo':
+                text_objects = self.history.redo(keyboard_input.text_objects)
+                if text_objects is not None:
+                    keyboard_input.text_objects = deque(text_objects, maxlen=20)
+                    self.show_guide = False
+            return 'redo'
+
+        elif 1024 < x1 < 1152:  # Guide
+            self.header = overlayList[9]
+            # Toggle guide display
+            self.show_guide = True  # Always show guide when selected
+            self.current_guide_index = 0  # Reset to first guide
+            self.current_guide = self.guideList[self.current_guide_index]  # Show first guide image
+            keyboard_input.active = False  # Close keyboard input if open
+            return 'guide'
+
+        elif 1155 < x1 < 1280:
+            if not keyboard_input.active:
+                keyboard_input.active = True
+            self.header = overlayList[10]
+            self.show_guide = False
+            return 'keyboard'
+
+        # Brush/Eraser size controls
+        elif 1155 < x1 < 1280 and y1 > 650:  # Bottom right area
+            if x1 < 1200:  # Left side - decrease size
+                if hand.drawColor == (0, 0, 0):  # Eraser
+                    hand.eraserSize = max(10, hand.eraserSize - 5)
+                else:  # Brush
+                    hand.brushSize = max(1, hand.brushSize - 1)
+            else:  # Right side - increase size
+                if hand.drawColor == (0, 0, 0):  # Eraser
+                    hand.eraserSize = min(200, hand.eraserSize + 5)
+                else:  # Brush
+                    hand.brushSize = min(50, hand.brushSize + 1)
+            self.notify('toast',
+                        f"{'Eraser' if hand.drawColor == (0, 0, 0) else 'Brush'} size: "
+                        f"{hand.eraserSize if hand.drawColor == (0, 0, 0) else hand.brushSize}")
+            return 'size'
+
+    def erase_text_at(self, x, y):
+        """Delete the topmost text object under (x, y), if any"""
+        text_objects = self.keyboard_input.text_objects
+        for i, obj in enumerate(reversed(text_objects)):
+            idx = len(text_objects) - 1 - i
+            text_size = cv2.getTextSize(obj['text'], obj['font'], obj['scale'], obj['thickness'])[0]
+
+            x_text, y_text = obj['position']
+            if (x_text <= x <= x_text + text_size[0] and
+                    y_text - text_size[1] <= y <= y_text):
+                del text_objects[idx]
+                return True
+        return False
+
+    def draw_stroke(self, label, hand, x1, y1):
+        """Draw the stroke from the hand's previous point to (x1, y1) on the canvas as one polyline
+
+        The frame gets the stroke when compose() copies the canvas over it.
+        """
+        if hand.drawColor == (0, 0, 0):  # eraser
+            thickness = hand.eraserSize
+        else:
+            thickness = hand.brushSize
+        self.actions.append(('draw', label, (hand.xp, hand.yp, x1, y1, thickness, hand.drawColor)))
+
+        if self.spline_strokes:
+            # A trail that does not end at the previous point belongs to an earlier stroke
+            if not hand.trail or hand.trail[-1] != (hand.xp, hand.yp):
+                hand.trail = [(hand.xp, hand.yp)]
+            p1 = hand.trail[-1]
+            p0 = hand.trail[-2] if len(hand.trail) > 1 else p1
+            # The next point is not known yet, continue in the current direction
+            p3 = (2 * x1 - p1[0], 2 * y1 - p1[1])
+            points = catmull_rom(p0, p1, (x1, y1), p3)
+            hand.trail = [p1, (x1, y1)]
+        else:
+            points = interpolate_points(hand.xp, hand.yp, x1, y1)
+
+        self.canvas.polyline(points, hand.drawColor, thickness)
+        path = list(map(tuple, points.tolist()))
+        self.history.record_path(hand, path, hand.drawColor, thickness)
+        hand.xp, hand.yp = path[-1]
+
+    def compose(self, packet):
+        """Blend the canvas, header, text, guide and extra overlays into the frame"""
+        start = time.perf_counter()
+        img = packet.img
+        keyboard_input = self.keyboard_input
+
+        # Copy the painted pixels over the camera image using the canvas' cached mask
+        self.canvas.composite(img)
+        start = packet.add_time('composite', start)
+
+        # Set Header Image
+        img[0:125, 0:1280] = self.header
+        start = packet.add_time('overlay', start)
+
+        # Draw keyboard text and placeholder
+        if keyboard_input.active:
+            # Draw semi-transparent typing area background
+            typing_area = np.zeros((100, 1280, 3), dtype=np.uint8)
+            typing_area[:] = (50, 50, 50)  # Dark gray background
+            img[620:720, 0:1280] = cv2.addWeighted(img[620:720, 0:1280], 0.7, typing_area, 0.3, 0)
+
+            keyboard_input.draw_cached(img)
+
+            # Draw instruction text
+            instruction_text = "Press Enter to confirm text, ESC to cancel"
+            cv2.putText(img, instruction_text, (20, 700),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 200), 1)
+        else:
+            # Draw existing text objects even when keyboard is inactive
+            keyboard_input.draw_cached(img)
+        start = packet.add_time('text', start)
+
+        # Display Guide Image if active
+        if self.show_guide and self.current_guide is not None:
+            if self.guide_blend:
+                # Create a composite image that preserves the drawing canvas
+                guide_area = img[125:720, 0:1280].copy()
+                # Blend the guide with the current camera feed (50% opacity)
+                blended_guide = cv2.addWeighted(self.current_guide, 0.3, guide_area, 0.3, 0)
+                # Put the blended guide back
+                img[125:720, 0:1280] = blended_guide
+            else:
+                # Add the dimmed guide over its drawn part only, leaving the camera image as it is
+                (x0, y0, x1, y1), dimmed = self.guide_overlay(self.current_guide_index)
+                roi = img[125 + y0:125 + y1, x0:x1]
+                cv2.add(roi, dimmed, dst=roi)
+
+            # Display guide navigation instructions
+            cv2.putText(img, f"Guide {self.current_guide_index + 1}/{len(self.guideList)}", (1100, 150),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+
+        # E.g. the profiler's timing table
+        for draw in self.overlays:
+            draw(img)
+        packet.add_time('overlay', start)
+
+        packet.img = img
+        return packet
+
+    def guide_overlay(self, index):
+        overlay = self.guide_overlays.get(index)
+        if overlay is None:
+            guide = self.guideList[index]
+            drawn = cv2.findNonZero(cv2.threshold(channel_max(guide), 20, 255, cv2.THRESH_BINARY)[1])
+            x, y, w, h = cv2.boundingRect(drawn) if drawn is not None else (0, 0, 0, 0)
+            dimmed = cv2.convertScaleAbs(guide[y:y + h, x:x + w], alpha=0.3)
+            overlay = self.guide_overlays[index] = ((x, y, x + w, y + h), dimmed)
+        return overlay
+
+    def encode(self, packet):
+        """JPEG bytes of the composed frame, scaled by output_scale, for the page to display as they are"""
+        start = time.perf_counter()
+        img = packet.img
+        if self.output_scale != 1.0:
+            size = (round(img.shape[1] * self.output_scale), round(img.shape[0] * self.output_scale))
+            if self.scaled is None or self.scaled.shape[:2] != (size[1], size[0]):
+                self.scaled = np.empty((size[1], size[0], 3), np.uint8)
+            img = cv2.resize(img, size, dst=self.scaled, interpolation=cv2.INTER_AREA)
+
+        # JPEG stores BGR frames directly, no color conversion needed
+        success, jpeg = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, self.output_quality])
+        packet.output = jpeg.tobytes()
+        packet.add_time('encode', start)
+        return packet
+
+    def render(self, packet):
+        """update() then compose(), the part of a frame that has to run in frame order"""
+        return self.compose(self.update(packet))
+
+    def process(self, packet):
+        """Run every stage on one frame on the calling thread"""
+        return self.encode(self.render(self.detect(packet)))
@@ -0,0 +1,407 @@
+# PainterLoop.py
+import functools
+import itertools
+import os
+import time
+import uuid
+import streamlit as st
+from PainterEngine import PainterEngine, FramePacket
+from FramePipeline import FramePipeline
+from FrameScheduler import FrameScheduler
+from DetectionWorker import DetectorPool
+from AssetStore import AssetStore
+from MjpegServer import MjpegServer, MjpegStreamLease
+from QualityGovernor import QualityGovernor
+from StageProfiler import StageProfiler
+from SessionTrace import TraceWriter
+
+
+# Resolutions hand detection can run at; landmarks are always mapped back to the full frame
+INFERENCE_SIZES = {
+    "Full frame": None,
+    "640x360": (640, 360),
+    "480x270": (480, 270),
+}
+
+# Save formats and the range of their level setting: PNG compression, WebP/JPEG quality
+SAVE_FORMATS = {
+    "PNG": ('png', 0, 9, 3),
+    "WebP": ('webp', 1, 101, 90),
+    "JPEG": ('jpeg', 1, 100, 90),
+}
+
+# Size of the displayed frame relative to the camera frame
+OUTPUT_SCALES = {
+    "100%": 1.0,
+    "75%": 0.75,
+    "50%": 0.5,
+}
+
+DETECTOR_BACKENDS = {
+    "In-process": 'in-process',
+    "Worker process": 'process',
+}
+
+
+def painter_settings():
+    """Performance options for the painter, shown in the sidebar"""
+    with st.sidebar.expander("Performance"):
+        streaming = st.checkbox(
+            "Stream video over local HTTP", value=False, key="painter_streaming",
+            help="Show the painter as an MJPEG stream from a local server instead of through Streamlit")
+        target_fps = st.slider(
+            "Target frame rate", 5, 60, 30, key="painter_target_fps",
+            help="Frames that cannot be shown in time are dropped instead of slowing the painter down")
+        adaptive_quality = st.checkbox(
+            "Adaptive quality", value=True, key="painter_adaptive_quality",
+            help="Lower the detection and display quality below these settings when frames take too long")
+        pipelined = st.checkbox(
+            "Pipelined processing", value=False, key="painter_pipelined",
+            help="Detect the next frame while the current one is composited and encoded")
+        detector_backend = st.selectbox(
+            "Hand detection", list(DETECTOR_BACKENDS), key="painter_detector_backend",
+            help="Run hand detection in a separate process so it uses another CPU core")
+        inference_size = st.selectbox(
+            "Detection resolution", list(INFERENCE_SIZES), index=1, key="painter_inference_size",
+            help="Smaller is faster; drawing still uses the full camera resolution")
+        keyframe_interval = st.slider(
+            "Detection keyframe interval", 1, 5, 1, key="painter_keyframe_interval",
+            help="Run hand detection every N frames and track the hand with optical flow in between")
+        smoothing = st.checkbox(
+            "Smooth landmarks", value=False, key="painter_smoothing",
+            help="One Euro filter on the landmarks to remove jitter")
+        predict = st.checkbox(
+            "Predict fingertip", value=False, key="painter_predict", disabled=not smoothing,
+            help="Move the index fingertip ahead by the measured latency")
+        min_cutoff = st.slider(
+            "Smoothing min cutoff (Hz)", 0.1, 5.0, 1.0, 0.1, key="painter_min_cutoff",
+            disabled=not smoothing, help="Lower removes more jitter when the hand is still")
+        beta = st.slider(
+            "Smoothing speed coefficient", 0.0, 0.05, 0.007, 0.001, format="%.3f", key="painter_beta",
+            disabled=not smoothing, help="Higher reduces lag on fast strokes")
+        spline_strokes = st.checkbox(
+            "Curved strokes", value=False, key="painter_spline_strokes",
+            help="Draw strokes as Catmull-Rom splines through the fingertip points instead of straight segments")
+        output_quality = st.slider(
+            "Display JPEG quality", 30, 100, 80, 5, key="painter_output_quality",
+            help="Frames are sent to the browser as JPEG; lower is smaller and faster to encode")
+        output_scale = st.selectbox(
+            "Display resolution", list(OUTPUT_SCALES), key="painter_output_scale",
+            help="Encode a smaller frame and let the browser scale it up")
+        undo_memory = st.slider(
+            "Undo checkpoint memory (MB)", 8, 512, 64, 8, key="painter_undo_memory",
+            help="Canvas snapshots that speed up undo; the oldest are dropped past this")
+        save_format = st.selectbox(
+            "Save format", list(SAVE_FORMATS), key="painter_save_format",
+            help="Saves are written in the background; an SVG of the strokes is saved as well")
+        file_format, low, high, default = SAVE_FORMATS[save_format]
+        save_level = st.slider(
+            "PNG compression" if file_format == 'png' else "Save quality", low, high, default,
+            key=f"painter_save_level_{file_format}",
+            help="Higher PNG compression is smaller but slower; WebP quality 101 is lossless")
+    with st.sidebar.expander("Profiling"):
+        timing_panel = st.checkbox(
+            "Show stage timings", value=False, key="painter_timing_panel",
+            help="p50/p95/p99 of every stage over the last frames")
+        timing_overlay = st.checkbox(
+            "Timing overlay in video", value=False, key="painter_timing_overlay")
+        st.download_button(
+            "Download timings (CSV)", painter_profiler().to_csv(), file_name="painter_timings.csv",
+            mime="text/csv", key="painter_timings_csv", on_click="ignore",
+            help="Timings of the last frames up to when this page last reran")
+        record_trace = st.checkbox(
+            "Record session trace", value=False, key="painter_record_trace",
+            help="Log landmarks, finger states and painter actions of every frame to traces/ "
+                 "(a few MB per hour), for replay with PainterBenchmark.py --trace")
+    return {
+        'timing_panel': timing_panel,
+        'timing_overlay': timing_overlay,
+        'record_trace': record_trace,
+        'streaming': streaming,
+        'target_fps': target_fps,
+        'adaptive_quality': adaptive_quality,
+        'pipelined': pipelined,
+        'detector_backend': DETECTOR_BACKENDS[detector_backend],
+        'inference_size': INFERENCE_SIZES[inference_size],
+        'keyframe_interval': keyframe_interval,
+        'smoothing': smoothing,
+        'predict': smoothing and predict,
+        'min_cutoff': min_cutoff,
+        'beta': beta,
+        'spline_strokes': spline_strokes,
+        'output_quality': output_quality,
+        'output_scale': OUTPUT_SCALES[output_scale],
+        'undo_budget': undo_memory * 1024 * 1024,
+        'save_format': file_format,
+        'save_level': save_level,
+    }
+
+
+def painter_profiler():
+    """This session's stage timings; kept across reruns so they can be downloaded"""
+    if 'painter_profiler' not in st.session_state:
+        st.session_state.painter_profiler = StageProfiler()
+    return st.session_state.painter_profiler
+
+
+def painter_recorder(settings, folder='traces'):
+    """This session's trace writer, or None when recording is off; appends to one file across reruns"""
+    if not settings['record_trace']:
+        return None
+    if 'painter_recorder' not in st.session_state:
+        path = os.path.join(folder, f"session_{time.strftime('%Y%m%d_%H%M%S')}.bttrace")
+        st.session_state.painter_recorder = TraceWriter(path)
+    return st.session_state.painter_recorder
+
+
+def detector_options(settings):
+    """handDetector keyword arguments for the sidebar settings"""
+    return {
+        'inferenceSize': settings['inference_size'],
+        'keyframeInterval': settings['keyframe_interval'],
+        'smoothing': settings['smoothing'],
+        'predict': settings['predict'],
+        'minCutoff': settings['min_cutoff'],
+        'beta': settings['beta'],
+    }
+
+
+@st.cache_resource(show_spinner="Loading images...")
+def asset_store():
+    """Header and guide images, prepared once per process and memory-mapped from .asset_cache"""
+    return AssetStore(atlasFolder='.asset_cache')
+
+
+@st.cache_resource(show_spinner="Loading hand detection model...")
+def detector_pool(backend, detectionCon=0.85):
+    """One pool of warmed-up detectors per process and configuration"""
+    return DetectorPool(backend, detectionCon=detectionCon)
+
+
+def make_detector(settings):
+    """Borrow a hand detector for this session, in-process or in a worker process as selected
+
+    The lease lives in session state, so reruns reuse the same detector and it
+    goes back to the pool when the session ends or its state is cleared.
+    """
+    pool = detector_pool(settings['detector_backend'])
+    lease = st.session_state.get('detector_lease')
+    if lease is None or lease.pool is not pool:
+        if lease is not None:
+            lease.release()
+        lease = st.session_state.detector_lease = pool.acquire()
+
+    detector = lease.detector
+    detector.configure(**detector_options(settings))
+    if getattr(detector, 'error', None):
+        st.warning(f"{detector.error}. Using in-process hand detection.")
+    return detector
+
+
+def painter_engine(detector, assets, settings):
+    """This session's PainterEngine, configured from the sidebar settings
+
+    The engine lives in session state, so a rerun (e.g. after changing a
+    setting) keeps the painting, its undo history and the text; only the
+    settings are applied to it again.
+    """
+    engine = st.session_state.get('painter_engine')
+    if engine is None:
+        engine = st.session_state.painter_engine = PainterEngine(
+            detector, assets.headers, assets.guides, undo_budget=settings['undo_budget'],
+            save_format=settings['save_format'], save_level=settings['save_level'],
+            output_quality=settings['output_quality'], output_scale=settings['output_scale'],
+            spline_strokes=settings['spline_strokes'])
+        return engine
+
+    engine.detector = detector
+    engine.history.budget = settings['undo_budget']
+    engine.saver.format = settings['save_format']
+    engine.saver.level = settings['save_level']
+    engine.output_quality = settings['output_quality']
+    engine.output_scale = settings['output_scale']
+    engine.spline_strokes = settings['spline_strokes']
+    engine.guide_blend = True  # The governor, if any, lowers it again
+
+    # The loop was interrupted: close open strokes and start new ones where the hands are now
+    engine.history.settle(engine.keyboard_input.text_objects)
+    for hand in engine.hands.values():
+        hand.xp, hand.yp = 0, 0
+    return engine
+
+
+@st.cache_resource
+def mjpeg_server():
+    """One local MJPEG server per process, every session streams through it"""
+    return MjpegServer()
+
+
+def make_governor(engine, settings):
+    """Quality governor starting from the sidebar settings, or None when adaptive quality is off"""
+    if not settings['adaptive_quality']:
+        return None
+    baseline = {
+        'inference_size': settings['inference_size'],
+        'keyframe_interval': settings['keyframe_interval'],
+        'output_quality': settings['output_quality'],
+        'output_scale': settings['output_scale'],
+        'guide_blend': True,
+    }
+    return QualityGovernor(engine, baseline, settings['target_fps'], settings['pipelined'])
+
+
+def painter_stream(settings):
+    """This session's MJPEG stream, or None when frames go through Streamlit
+
+    The stream is closed when streaming is turned off, and when the session
+    ends or its state is cleared, so the server does not keep it forever.
+    """
+    lease = st.session_state.get('painter_stream_lease')
+    if not settings['streaming']:
+        if lease is not None:
+            lease.release()
+            del st.session_state.painter_stream_lease
+        return None
+    if lease is None:
+        stream = mjpeg_server().stream(uuid.uuid4().hex)
+        lease = st.session_state.painter_stream_lease = MjpegStreamLease(stream)
+    return lease.stream
+
+
+def show_notifications(engine):
+    for kind, message in engine.pop_notifications():
+        getattr(st, kind)(message)
+
+
+def show_frame(FRAME_WINDOW, packet, stream=None):
+    start = time.perf_counter()
+    if stream is not None:
+        stream.publish(packet.output)
+    else:
+        # JPEG bytes are sent as they are; the width keeps a downscaled frame at camera size
+        FRAME_WINDOW.image(packet.output, width=packet.img.shape[1], output_format="JPEG")
+    packet.timings['show'] = time.perf_counter() - start
+
+
+def show_status(status, scheduler, governor, panel, profiler, timings, now):
+    # Updating Streamlit costs time too, so only about once a second
+    if now - scheduler.reported >= 1.0:
+        status.caption(f"Frame rate: {scheduler.report()}")
+        if governor is not None:
+            panel.text("\n".join(governor.status()))
+        if timings is not None:
+            timings.text("\n".join(profiler.table()))
+        scheduler.reported = now
+
+
+def frame_shown(engine, scheduler, governor, packet):
+    engine.detector.reportLatency(time.monotonic() - packet.timestamp)
+    scheduler.frame_shown()
+    if governor is not None:
+        governor.observe(packet)
+
+
+def run_painter_loop(run, FRAME_WINDOW, cap, engine, pipelined=False, stream=None, fps=30, governor=None,
+                     profiler=None, timing_panel=False, timing_overlay=False, recorder=None):
+    """Feed camera frames through the engine and show them until run is False
+
+    Frames are paced to fps by a FrameScheduler; a frame that is already late
+    is updated (so no gesture is lost) but not encoded or shown. With a
+    stream, frames are published to it and FRAME_WINDOW only shows the
+    stream's URL once, so Streamlit is not involved in the video at all.
+    A governor sees the timings of every shown frame and its decisions are
+    shown in a sidebar panel. A profiler records the stage timings of every
+    frame, optionally shown in the sidebar and drawn into the video. A
+    recorder (SessionTrace.TraceWriter) logs every frame's hands and actions.
+    """
+    if stream is not None and run:
+        FRAME_WINDOW.image(stream.url, width=engine.canvas.width)
+    scheduler = FrameScheduler(fps)
+    status = st.empty()
+    panel = st.sidebar.expander("Quality governor").empty() if governor is not None else None
+    profiler = profiler or StageProfiler()
+    timings = st.sidebar.expander("Stage timings", expanded=True).empty() if timing_panel else None
+    # Set rather than appended to, the engine is reused across reruns
+    engine.overlays = [profiler.draw] if timing_overlay else []
+    report = functools.partial(show_status, status, scheduler, governor, panel, profiler, timings)
+    engine.recorder = recorder
+
+    try:
+        if pipelined:
+            run_pipelined(run, FRAME_WINDOW, cap, engine, scheduler, report, profiler, stream=stream,
+                          governor=governor)
+        else:
+            run_sequential(run, FRAME_WINDOW, cap, engine, scheduler, report, profiler, stream=stream,
+                           governor=governor)
+    finally:
+        # Frames still buffered when the loop stops or the page reruns
+        if recorder is not None:
+            recorder.flush()
+
+
+def run_sequential(run, FRAME_WINDOW, cap, engine, scheduler, report, profiler, stream=None, governor=None):
+    """run_painter_loop's frame loop, every stage on the script thread"""
+    index = itertools.count()
+
+    while run:
+        # Import Image
+        start = time.perf_counter()
+        success, img = cap.read()
+        if not success:
+            continue
+        packet = FramePacket(img, cap.read_timestamp, next(index))
+        packet.add_time('capture', start)
+
+        packet = engine.render(engine.detect(packet))
+        show_notifications(engine)
+
+        if scheduler.late():
+            scheduler.drop()
+        else:
+            # Display the image in Streamlit
+            show_frame(FRAME_WINDOW, engine.encode(packet), stream)
+            frame_shown(engine, scheduler, governor, packet)
+        report(time.monotonic())
+
+        packet.timings['sleep'] = scheduler.wait()
+        profiler.record(packet.timings)
+
+
+def run_pipelined(run, FRAME_WINDOW, cap, engine, scheduler, report, profiler, queue_size=2, stream=None,
+                  governor=None):
+    """Same as run_painter_loop, with capture, detect, render and encode each on its own thread"""
+    index = itertools.count()
+
+    def capture():
+        # The scheduler paces the whole pipeline from here
+        slept = scheduler.wait()
+        start = time.perf_counter()
+        success, img = cap.read()
+        if not success:
+            return None
+        packet = FramePacket(img, cap.read_timestamp, next(index))
+        packet.add_time('capture', start)
+        packet.timings['sleep'] = slept
+        return packet
+
+    # render() stays on a single thread so gestures are applied in frame order
+    pipeline = FramePipeline(capture, [engine.detect, engine.render, engine.encode], queue_size)
+    pipeline.start()
+    try:
+        while run:
+            packet = pipeline.get()
+            if packet is None:
+                continue
+            show_notifications(engine)
+
+            # Showing the frame fell behind if a newer one is already waiting
+            if pipeline.backlog():
+                scheduler.drop()
+            else:
+                # Streamlit elements can only be updated from the script thread
+                show_frame(FRAME_WINDOW, packet, stream)
+                frame_shown(engine, scheduler, governor, packet)
+            profiler.record(packet.timings)
+            report(time.monotonic())
+    finally:
+        pipeline.stop()
@@ -0,0 +1,288 @@
+# PainterMicrobench.py
+"""Microbenchmarks of the painter's per-frame hot functions on synthetic inputs, checked against a baseline
+
+    python PainterMicrobench.py --save-baseline     # record this machine's baseline
+    python PainterMicrobench.py                     # compare with it
+    python PainterMicrobench.py stroke composite --threshold 0.25
+
+Every benchmark times one call of the real painter code (no camera needed)
+and reports the best of several repeats in microseconds. Without
+--save-baseline the results are compared with the baseline file, and the
+exit status is 1 when any benchmark got slower by more than the threshold,
+or when the quick check that undo and redo keep typed text fails first.
+Baselines are only comparable on the machine they were recorded on.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import timeit
+import types
+import numpy as np
+import HandTrackingModule as htm
+from AssetStore import AssetStore
+from KeyboardInput import KeyboardInput
+from PainterEngine import PainterEngine, FramePacket, HandState
+
+BASELINE_FILE = '.microbench_baseline.json'
+FRAME_SHAPE = (720, 1280, 3)
+
+# name -> setup() returning the function to time, in the order they run
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def synthetic_frame(seed=0):
+    return np.random.default_rng(seed).integers(0, 256, FRAME_SHAPE, np.uint8)
+
+
+def synthetic_text(keyboard_input, count=20):
+    """Fill keyboard_input with count text objects spread over the frame"""
+    for i in range(count):
+        keyboard_input.text = f"Text object {i}"
+        keyboard_input.current_input_position = (40 + 300 * (i % 4), 200 + 90 * (i // 4))
+        keyboard_input.add_text_object()
+    keyboard_input.text = ""
+
+
+def synthetic_engine():
+    """An engine with a painted canvas and 20 text objects, not attached to a detector"""
+    assets = AssetStore()
+    engine = PainterEngine(None, assets.headers, assets.guides, use_keyboard=False)
+    hand = HandState()
+    for x, y in circle_points((640, 420), 200, 64):
+        if hand.xp == 0 and hand.yp == 0:
+            hand.xp, hand.yp = x, y
+        engine.draw_stroke('Right', hand, x, y)
+    synthetic_text(engine.keyboard_input)
+    return engine
+
+
+def circle_points(center, radius, count):
+    return [(int(center[0] + radius * math.cos(2 * math.pi * i / count)),
+             int(center[1] + radius * math.sin(2 * math.pi * i / count))) for i in range(count)]
+
+
+@benchmark('stroke')
+def stroke(spline=False):
+    """One frame of a stroke: interpolated, drawn on the canvas and recorded for undo"""
+    engine = synthetic_engine()
+    engine.spline_strokes = spline
+    hand = HandState()
+    points = circle_points((640, 420), 200, 64)  # About 20 px per frame
+    hand.xp, hand.yp = points[-1]
+    step = iter(range(sys.maxsize))
+
+    def run():
+        i = next(step) % len(points)
+        if i == 0:
+            # Keep the stroke from growing without bound
+            engine.history.pending.clear()
+            engine.actions = []
+        engine.draw_stroke('Right', hand, *points[i])
+    return run
+
+
+@benchmark('stroke_spline')
+def stroke_spline():
+    """The same with Catmull-Rom spline strokes"""
+    return stroke(spline=True)
+
+
+@benchmark('composite')
+def composite():
+    """compose(): canvas, header, text objects and overlays over a camera frame"""
+    engine = synthetic_engine()
+    frame = synthetic_frame()
+    img = frame.copy()
+
+    def run():
+        img[:] = frame
+        engine.compose(FramePacket(img))
+    return run
+
+
+@benchmark('text_draw')
+def text_draw():
+    """KeyboardInput.draw() of 20 text objects"""
+    keyboard_input = KeyboardInput()
+    synthetic_text(keyboard_input)
+    img = synthetic_frame()
+    return lambda: keyboard_input.draw(img)
+
+
+@benchmark('text_draw_cached')
+def text_draw_cached():
+    """KeyboardInput.draw_cached() of the same 20 unchanged text objects"""
+    keyboard_input = KeyboardInput()
+    synthetic_text(keyboard_input)
+    img = synthetic_frame()
+    return lambda: keyboard_input.draw_cached(img)
+
+
+@benchmark('drag_start')
+def drag_start():
+    """KeyboardInput.check_drag_start() missing all 20 text objects, the most common case"""
+    keyboard_input = KeyboardInput()
+    synthetic_text(keyboard_input)
+    return lambda: keyboard_input.check_drag_start(1270, 710)
+
+
+@benchmark('eraser_hit')
+def eraser_hit():
+    """The eraser's text hit-test against 20 text objects, missing all of them"""
+    engine = synthetic_engine()
+    return lambda: engine.erase_text_at(1270, 710)
+
+
+def synthetic_results(hands=2, seed=0):
+    """MediaPipe-like hand results with random landmarks"""
+    rng = np.random.default_rng(seed)
+    landmarks = [types.SimpleNamespace(landmark=[types.SimpleNamespace(x=x, y=y, z=z)
+                                                 for x, y, z in rng.random((21, 3))])
+                 for _ in range(hands)]
+    handedness = [types.SimpleNamespace(classification=[types.SimpleNamespace(label=label)])
+                  for label in ('Right', 'Left')[:hands]]
+    return types.SimpleNamespace(multi_hand_landmarks=landmarks, multi_handedness=handedness)
+
+
+@benchmark('fingers')
+def fingers():
+    """handDetector.findPosition() and fingersUp() for a new frame of MediaPipe results"""
+    detector = htm.handDetector(maxHands=2)
+    detector.results = synthetic_results()
+    img = synthetic_frame()
+
+    def run():
+        detector.positions = None  # As findHands() does for every frame
+        detector.labels = None
+        detector.findPosition(img, draw=False)
+        return detector.fingersUp()
+    return run
+
+
+@benchmark('commit')
+def commit():
+    """UndoHistory.commit() of a short stroke with 20 text objects (replaces KeyboardInput.save_state)"""
+    engine = synthetic_engine()
+    history = engine.history
+    text_objects = engine.keyboard_input.text_objects
+    points = circle_points((640, 420), 100, 8)
+    step = iter(range(sys.maxsize))
+
+    def run():
+        i = next(step) % len(points)
+        history.record_path('Right', [points[i - 1], points[i]], (255, 0, 255), 10)
+        history.commit(text_objects)
+    return run
+
+
+def hand_packet(x, y, fingers):
+    """A frame with one right hand whose landmarks all sit at (x, y)"""
+    packet = FramePacket(np.zeros(FRAME_SHAPE, np.uint8))
+    packet.labels = ['Right']
+    packet.points = np.full((1, 21, 2), (x, y), np.int32)
+    packet.fingers = np.array([fingers], np.uint8)
+    return packet
+
+
+def check_text_undo():
+    """Typed text is one undo step after the stroke before it, and comes back with Redo"""
+    assets = AssetStore()
+    engine = PainterEngine(None, assets.headers, assets.guides, use_keyboard=False)
+    keyboard_input = engine.keyboard_input
+    for x in range(300, 400, 20):
+        engine.update(hand_packet(x, 400, (0, 1, 0, 0, 0)))  # Draw
+    engine.update(hand_packet(0, 0, (0, 0, 0, 0, 0)))  # Lift
+
+    keyboard_input.active = True
+    for key in b"abc\r":
+        keyboard_input.process_key_input(key)
+    engine.update(FramePacket(np.zeros(FRAME_SHAPE, np.uint8)))
+
+    def press(x):
+        engine.update(hand_packet(x, 60, (0, 1, 1, 0, 0)))
+        engine.update(hand_packet(x, 400, (0, 0, 0, 0, 0)))  # Release the button
+
+    press(830)  # Undo
+    undone = [obj['text'] for obj in keyboard_input.text_objects]
+    press(960)  # Redo
+    redone = [obj['text'] for obj in keyboard_input.text_objects]
+    if undone != [] or redone != ['abc']:
+        return [f"text undo/redo: got {undone} after Undo and {redone} after Redo, expected [] and ['abc']"]
+    return []
+
+
+def measure(run, repeat=5, min_time=0.2):
+    """Seconds per call of run, best of repeat runs of about min_time each"""
+    timer = timeit.Timer(run)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    return min(timer.repeat(repeat, number)) / number
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('names', nargs='*', help=f"benchmarks to run (default all): {', '.join(BENCHMARKS)}")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="baseline JSON file")
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the baseline")
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help="flag benchmarks slower than the baseline by more than this fraction")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.2, help="seconds per repeat")
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+
+    # Timing a painter that gets things wrong is pointless
+    failures = check_text_undo()
+    if failures:
+        print("\n".join(failures))
+        return 1
+
+    baseline = load_baseline(args.baseline)
+    results = {}
+    regressions = []
+    print(f"{'benchmark':<18} {'us/call':>10} {'baseline':>10} {'change':>8}")
+    for name in args.names or BENCHMARKS:
+        seconds = results[name] = measure(BENCHMARKS[name](), args.repeat, args.min_time)
+        line = f"{name:<18} {seconds * 1e6:10.1f}"
+        if name in baseline and not args.save_baseline:
+            change = seconds / baseline[name] - 1
+            line += f" {baseline[name] * 1e6:10.1f} {change:+8.1%}"
+            if change > args.threshold:
+                line += "  REGRESSION"
+                regressions.append(name)
+        print(line)
+
+    if args.save_baseline:
+        # Keep the baselines of benchmarks that were not run
+        with open(args.baseline, 'w') as f:
+            json.dump({**baseline, **results}, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif not baseline:
+        print(f"No baseline in {args.baseline} yet, record one with --save-baseline")
+    elif regressions:
+        print(f"Slower than the baseline by more than {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+# QualityGovernor.py
+import time
+from collections import deque
+
+# Steps from best to worst quality, each making one knob cheaper. A step that
+# would not lower the quality below the previous level is skipped.
+QUALITY_STEPS = [
+    ('output_quality', 65),
+    ('keyframe_interval', 2),
+    ('inference_size', (480, 270)),
+    ('guide_blend', False),
+    ('output_scale', 0.75),
+    ('keyframe_interval', 3),
+    ('output_quality', 50),
+    ('output_scale', 0.5),
+]
+
+
+def cheaper(name, old, new):
+    """Whether new is a lower quality (faster) setting of the knob than old"""
+    if name == 'keyframe_interval':
+        return new > old
+    if name == 'inference_size':
+        # None is the full frame
+        return old is None or (new is not None and new[0] * new[1] < old[0] * old[1])
+    if name == 'guide_blend':
+        return old and not new
+    return new < old
+
+
+# Stages that run on the same thread when pipelined, so their timings add up
+PIPELINE_STAGES = (
+    ('flip', 'findHands', 'landmarks'),
+    ('gestures', 'composite', 'text', 'overlay'),
+    ('encode',),
+    ('show',),
+)
+
+# Time spent waiting (for the camera, or for the next frame to be due), not working
+IDLE_STAGES = ('capture', 'sleep')
+
+
+class QualityGovernor:
+    """Holds a target frame time by trading quality for speed, one step at a time
+
+    observe() is given every shown FramePacket and keeps a moving average of
+    its stage timings (their sum, or the slowest pipeline thread when the
+    stages run in parallel). When the average stays above the target frame
+    time the governor moves one level down the QUALITY_STEPS ladder, and when
+    there is plenty of headroom for a while it moves back up, never above the
+    baseline the user chose. Knobs are applied to the engine and its detector.
+    """
+
+    def __init__(self, engine, baseline, fps=30.0, pipelined=False, weight=0.1,
+                 cooldown=1.0, recover_delay=3.0):
+        self.engine = engine
+        self.target = 1.0 / fps
+        self.pipelined = pipelined
+        self.weight = weight
+        self.cooldown = cooldown  # Seconds between two changes
+        self.recover_delay = recover_delay  # Seconds of headroom before quality goes back up
+
+        self.levels = [dict(baseline)]
+        for name, value in QUALITY_STEPS:
+            if cheaper(name, self.levels[-1][name], value):
+                self.levels.append({**self.levels[-1], name: value})
+
+        self.level = 0
+        self.frame_time = None  # Moving average of the frame cost in seconds
+        self.last_change = time.monotonic()
+        self.headroom_since = None
+        self.decisions = deque(maxlen=5)  # Most recent changes, for the debug panel
+        self.apply(self.levels[0])
+
+    @property
+    def knobs(self):
+        return self.levels[self.level]
+
+    def observe(self, packet):
+        timings = packet.timings
+        if not timings:
+            return
+        if self.pipelined:
+            cost = max(sum(timings.get(name, 0.0) for name in stage) for stage in PIPELINE_STAGES)
+        else:
+            cost = sum(seconds for stage, seconds in timings.items() if stage not in IDLE_STAGES)
+        if self.frame_time is None:
+            self.frame_time = cost
+        self.frame_time += self.weight * (cost - self.frame_time)
+
+        now = time.monotonic()
+        if self.frame_time < 0.6 * self.target:
+            if self.headroom_since is None:
+                self.headroom_since = now
+        else:
+            self.headroom_since = None
+
+        if now - self.last_change < self.cooldown:
+            return
+        if self.frame_time > 1.1 * self.target and self.level < len(self.levels) - 1:
+            self.change(self.level + 1, now, "over budget")
+        elif (self.headroom_since is not None and now - self.headroom_since >= self.recover_delay
+              and self.level > 0):
+            self.change(self.level - 1, now, "headroom")
+
+    def change(self, level, now, reason):
+        old, new = self.levels[self.level], self.levels[level]
+        self.level = level
+        self.last_change = now
+        self.headroom_since = None
+        self.apply(new, old)
+        changed = ", ".join(f"{name} {old[name]} -> {new[name]}" for name in new if new[name] != old[name])
+        self.decisions.appendleft(
+            f"{time.strftime('%H:%M:%S')} level {level} ({reason}, "
+            f"{self.frame_time * 1000:.0f} ms vs {self.target * 1000:.0f} ms): {changed}")
+
+    def apply(self, knobs, old=None):
+        engine = self.engine
+        engine.output_quality = knobs['output_quality']
+        engine.output_scale = knobs['output_scale']
+        engine.guide_blend = knobs['guide_blend']
+
+        # Reconfigure the detector only when its knobs change
+        detector_knobs = ('inference_size', 'keyframe_interval')
+        if old is None or any(knobs[name] != old[name] for name in detector_knobs):
+            engine.detector.configure(inferenceSize=knobs['inference_size'],
+                                      keyframeInterval=knobs['keyframe_interval'])
+
+    def status(self):
+        """Lines describing the current state, for the debug panel"""
+        frame_time = "-" if self.frame_time is None else f"{self.frame_time * 1000:.1f} ms"
+        lines = [
+            f"Level {self.level} of {len(self.levels) - 1}, frame cost {frame_time} "
+            f"(target {self.target * 1000:.1f} ms)",
+        ]
+        lines.extend(f"{name}: {value}" for name, value in self.knobs.items())
+        lines.extend(self.decisions)
+        return lines
@@ -0,0 +1,198 @@
+# SessionTrace.py
+import os
+import struct
+import zlib
+import numpy as np
+
+MAGIC = b"BTBTRACE"
+VERSION = 2
+CHUNK = struct.Struct("<4sIIII")  # b"CHNK", frames, hands, actions, compressed body size
+
+# Hand labels are stored as indices into a table of the chunk's label strings,
+# action kinds and header buttons as indices into these
+NO_LABEL = 255
+ACTIONS = ('select', 'draw')
+BUTTONS = ('save', 'pink', 'blue', 'green', 'yellow', 'eraser', 'undo', 'redo', 'guide', 'keyboard', 'size')
+ACTION_ARGS = 6  # int32 arguments stored per action
+
+
+def encode_action(kind, args):
+    """Integer arguments of an action: ('select', (button,)) or ('draw', (x0, y0, x1, y1, width, (b, g, r)))"""
+    if kind == 'select':
+        return (BUTTONS.index(args[0]),) + (0,) * (ACTION_ARGS - 1)
+    *segment, (b, g, r) = args
+    return tuple(segment) + (b | g << 8 | r << 16,)
+
+
+def decode_action(kind, values):
+    if kind == 'select':
+        return (BUTTONS[values[0]],)
+    *segment, color = values
+    return tuple(segment) + ((color & 255, color >> 8 & 255, color >> 16 & 255),)
+
+
+class TraceFrame:
+    """One frame read back from a trace"""
+
+    def __init__(self, index, timestamp, labels, points, fingers, actions):
+        self.index = index
+        self.timestamp = timestamp
+        self.labels = labels  # Hand key per hand, e.g. 'Right' or 'Right1'
+        self.points = points  # (hands, 21, 2) int32 landmark pixels
+        self.fingers = fingers  # (hands, 5) uint8
+        self.actions = actions  # (kind, label, args) tuples, see encode_action()
+
+
+class TraceWriter:
+    """Appends frames to a session trace: landmarks, finger states and painter actions
+
+    Frames are buffered and written every chunkFrames frames as one chunk of
+    columns (timestamps, hand counts, labels, int16 landmark pixels, packed
+    finger bits, actions), zlib-compressed. Labels are indices into a table of
+    the label strings seen in the chunk, so any hand key is kept as it is. An
+    existing trace is appended to, so one file can hold a whole session across
+    reruns, and a crash loses at most the frames of the unwritten chunk.
+    """
+
+    def __init__(self, path, chunkFrames=60, level=1):
+        self.path = path
+        self.chunkFrames = chunkFrames
+        self.level = level
+        self.clear()
+
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(MAGIC + struct.pack("<I", VERSION))
+            self.file.flush()
+
+    def clear(self):
+        self.indices = []
+        self.timestamps = []
+        self.hand_counts = []
+        self.action_counts = []
+        self.labels = []
+        self.points = []
+        self.fingers = []
+        self.action_kinds = []
+        self.action_labels = []
+        self.action_args = []
+        self.label_table = {}  # Label -> its index in this chunk's table
+
+    def label_code(self, label):
+        if label is None:
+            return NO_LABEL
+        return self.label_table.setdefault(label, len(self.label_table))
+
+    def record(self, packet):
+        """Add a FramePacket: its landmarks and finger states, and the (kind, label, args) actions it caused"""
+        self.indices.append(packet.index)
+        self.timestamps.append(packet.timestamp)
+        self.hand_counts.append(len(packet.points))
+        self.labels.extend(self.label_code(label) for label in packet.labels)
+        self.points.append(packet.points)
+        self.fingers.append(packet.fingers)
+
+        self.action_counts.append(len(packet.actions))
+        for kind, label, args in packet.actions:
+            self.action_kinds.append(ACTIONS.index(kind))
+            self.action_labels.append(self.label_code(label))
+            self.action_args.append(encode_action(kind, args))
+
+        if len(self.indices) >= self.chunkFrames:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered frames as one chunk"""
+        if not self.indices:
+            return
+        frames, hands, actions = len(self.indices), len(self.labels), len(self.action_kinds)
+        points = np.concatenate(self.points) if hands else np.zeros((0, 21, 2))
+        fingers = np.concatenate(self.fingers) if hands else np.zeros((0, 5))
+        table = "\n".join(self.label_table).encode()
+        columns = [
+            np.array([len(table)], '<u4'),
+            np.frombuffer(table, np.uint8),
+            np.array(self.indices, '<i8'),
+            np.array(self.timestamps, '<f8'),
+            np.array(self.hand_counts, '<u1'),
+            np.array(self.action_counts, '<u2'),
+            np.array(self.labels, '<u1'),
+            points.astype('<i2'),
+            np.packbits(fingers.astype(bool), axis=1, bitorder='little'),
+            np.array(self.action_kinds, '<u1'),
+            np.array(self.action_labels, '<u1'),
+            np.array(self.action_args, '<i4').reshape(actions, ACTION_ARGS),
+        ]
+        body = zlib.compress(b"".join(column.tobytes() for column in columns), self.level)
+        self.file.write(CHUNK.pack(b"CHNK", frames, hands, actions, len(body)) + body)
+        self.file.flush()
+        self.clear()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def read_trace(path):
+    """Stream the frames of a trace back as TraceFrames; stops quietly at a truncated last chunk"""
+    with open(path, 'rb') as f:
+        header = f.read(len(MAGIC) + 4)
+        if header[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a session trace")
+        version, = struct.unpack("<I", header[len(MAGIC):])
+        if version != VERSION:
+            raise ValueError(f"{path} has trace version {version}, expected {VERSION}")
+
+        while True:
+            head = f.read(CHUNK.size)
+            if len(head) < CHUNK.size:
+                return
+            magic, frames, hands, actions, size = CHUNK.unpack(head)
+            body = f.read(size)
+            if magic != b"CHNK" or len(body) < size:
+                return
+            yield from read_chunk(zlib.decompress(body), frames, hands, actions)
+
+
+def read_chunk(body, frames, hands, actions):
+    offset = 0
+
+    def column(dtype, count, shape=()):
+        nonlocal offset
+        array = np.frombuffer(body, dtype, count * int(np.prod(shape)), offset).reshape((count,) + shape)
+        offset += array.nbytes
+        return array
+
+    size, = column('<u4', 1)
+    table = column('u1', int(size)).tobytes().decode()
+    table = table.split("\n") if table else []
+
+    def label_name(code):
+        return table[code] if code < len(table) else None
+
+    indices = column('<i8', frames)
+    timestamps = column('<f8', frames)
+    hand_counts = column('<u1', frames)
+    action_counts = column('<u2', frames)
+    labels = column('<u1', hands)
+    points = column('<i2', hands, (21, 2)).astype(np.int32)
+    fingers = np.unpackbits(column('<u1', hands, (1,)), axis=1, count=5, bitorder='little')
+    action_kinds = column('<u1', actions)
+    action_labels = column('<u1', actions)
+    action_args = column('<i4', actions, (ACTION_ARGS,))
+
+    hand = action = 0
+    for i in range(frames):
+        h, a = hand_counts[i], action_counts[i]
+        yield TraceFrame(
+            int(indices[i]), float(timestamps[i]),
+            [label_name(code) for code in labels[hand:hand + h]],
+            points[hand:hand + h], fingers[hand:hand + h],
+            [(ACTIONS[kind], label_name(code), decode_action(ACTIONS[kind], args.tolist()))
+             for kind, code, args in zip(action_kinds[action:action + a], action_labels[action:action + a],
+                                         action_args[action:action + a])])
+        hand += h
+        action += a
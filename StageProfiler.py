@@ -0,0 +1,87 @@
+# StageProfiler.py
+import io
+import time
+import cv2
+import numpy as np
+
+# Stages of one painter frame, in the order they run
+STAGES = ('capture', 'flip', 'findHands', 'landmarks', 'gestures', 'composite', 'text', 'overlay',
+          'encode', 'show', 'sleep')
+
+PERCENTILES = (50, 95, 99)
+
+
+class StageProfiler:
+    """Timings of the last size frames per stage, in a fixed-size ring buffer
+
+    record() takes a FramePacket.timings dict (seconds per stage); stages a
+    frame did not run are stored as NaN and ignored by the statistics.
+    """
+
+    def __init__(self, size=300, stages=STAGES):
+        self.stages = tuple(stages)
+        self.columns = {stage: i for i, stage in enumerate(self.stages)}
+        self.samples = np.full((size, len(self.stages)), np.nan, np.float32)
+        self.count = 0  # Frames recorded so far, the ring buffer holds the last size of them
+
+        self.overlay_lines = []
+        self.overlay_updated = 0.0
+
+    def record(self, timings):
+        row = self.samples[self.count % len(self.samples)]
+        row[:] = np.nan
+        for stage, seconds in timings.items():
+            column = self.columns.get(stage)
+            if column is not None:
+                row[column] = seconds
+        self.count += 1
+
+    def recorded(self):
+        """Recorded rows, oldest first"""
+        size = len(self.samples)
+        if self.count <= size:
+            return self.samples[:self.count]
+        start = self.count % size
+        return np.concatenate([self.samples[start:], self.samples[:start]])
+
+    def percentiles(self):
+        """{stage: (p50, p95, p99)} in milliseconds, for the stages that ran"""
+        rows = self.recorded()
+        stats = {}
+        for stage, column in self.columns.items():
+            values = rows[:, column]
+            values = values[~np.isnan(values)]
+            if len(values):
+                stats[stage] = tuple(np.percentile(values, PERCENTILES) * 1000)
+        return stats
+
+    def table(self):
+        """Lines of a p50/p95/p99 table, one per stage"""
+        lines = [f"{'stage':<10} {'p50':>6} {'p95':>6} {'p99':>6}  ms"]
+        for stage, (p50, p95, p99) in self.percentiles().items():
+            lines.append(f"{stage:<10} {p50:6.1f} {p95:6.1f} {p99:6.1f}")
+        return lines
+
+    def to_csv(self):
+        """The recorded frames as CSV, one row per frame, milliseconds per stage (empty if not run)"""
+        out = io.StringIO()
+        out.write(",".join(("frame",) + self.stages) + "\n")
+        first = self.count - len(self.recorded())
+        for i, row in enumerate(self.recorded()):
+            cells = ["" if np.isnan(value) else f"{value * 1000:.3f}" for value in row]
+            out.write(",".join([str(first + i)] + cells) + "\n")
+        return out.getvalue()
+
+    def draw(self, img, origin=(20, 175)):
+        """Draw the percentile table onto img (recomputed about once a second)"""
+        now = time.monotonic()
+        if now - self.overlay_updated >= 1.0:
+            self.overlay_lines = self.table()
+            self.overlay_updated = now
+
+        x, y = origin
+        height = 18 * len(self.overlay_lines) + 8
+        roi = img[y - 16:y - 16 + height, x - 6:x + 290]
+        roi[:] = roi // 3  # Darken behind the text so it stays readable
+        for i, line in enumerate(self.overlay_lines):
+            cv2.putText(img, line, (x, y + 18 * i), cv2.FONT_HERSHEY_PLAIN, 1.0, (255, 255, 255), 1)
@@ -0,0 +1,63 @@
+# Strokes.py
+from xml.sax.saxutils import escape
+import numpy as np
+
+ERASER = (0, 0, 0)  # Drawing in black erases
+
+
+class Stroke:
+    """One polyline drawn with a single tool, color and width
+
+    Replaying a stroke draws exactly the same segments that were drawn live, so
+    a canvas can be rebuilt from its strokes alone.
+    """
+
+    __slots__ = ('color', 'width', 'points')
+
+    def __init__(self, color, width, points):
+        self.color = color
+        self.width = width
+        self.points = list(points)
+
+    @property
+    def tool(self):
+        return 'eraser' if self.color == ERASER else 'brush'
+
+    def extend(self, point):
+        # Zero-length segments add nothing, the round caps of the neighbouring segments cover them
+        if point != self.points[-1]:
+            self.points.append(point)
+
+    def draw(self, canvas):
+        """Draw the stroke on a PaintCanvas, as one polyline (the same pixels as its segments drawn live)"""
+        canvas.polyline(np.array(self.points, np.int32), self.color, self.width)
+
+    def svg(self):
+        b, g, r = self.color
+        points = " ".join(f"{x},{y}" for x, y in self.points)
+        if len(self.points) == 1:
+            points = f"{points} {points}"
+        return (f'<polyline points="{points}" fill="none" stroke="#{r:02x}{g:02x}{b:02x}" '
+                f'stroke-width="{self.width}" stroke-linecap="round" stroke-linejoin="round"/>')
+
+
+def text_svg(obj):
+    """SVG <text> for a KeyboardInput text object, approximating the Hershey font"""
+    b, g, r = obj['color']
+    x, y = obj['position']
+    return (f'<text x="{x}" y="{y}" font-family="sans-serif" font-size="{30 * obj["scale"]:.1f}" '
+            f'fill="#{r:02x}{g:02x}{b:02x}" stroke="#{r:02x}{g:02x}{b:02x}" stroke-width="{obj["thickness"]}">'
+            f'{escape(obj["text"])}</text>')
+
+
+def to_svg(strokes, text_objects, width, height):
+    """SVG document of the strokes and text objects on a black background, like the saved PNG"""
+    lines = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="0 0 {width} {height}">',
+        f'<rect width="{width}" height="{height}" fill="#000000"/>',
+    ]
+    lines.extend(stroke.svg() for stroke in strokes)
+    lines.extend(text_svg(obj) for obj in text_objects)
+    lines.append('</svg>')
+    return "\n".join(lines) + "\n"
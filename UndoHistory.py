@@ -0,0 +1,168 @@
+# UndoHistory.py
+from PaintCanvas import PaintCanvas
+from Strokes import Stroke
+
+
+class UndoHistory:
+    """Undo/redo for a PaintCanvas and the text objects, stored as vector strokes
+
+    Every path drawn on the canvas is recorded with record_path(), which extends
+    a compact Stroke (points, color, width). Each undo entry holds the strokes
+    drawn since the previous one, plus the text objects if they changed. Every
+    checkpoint_interval entries a copy of the painted part of the canvas is kept
+    as a checkpoint; undo and redo restore the nearest checkpoint at or before
+    the target entry and replay the few strokes after it. Checkpoints are only a
+    shortcut (the canvas can always be replayed from blank), so the oldest are
+    dropped when they grow past budget bytes.
+
+    Changes made while a transaction is open (e.g. a whole stroke, from the
+    moment the finger goes down until it lifts) are coalesced: commit() does
+    nothing until every open transaction has ended.
+    """
+
+    def __init__(self, canvas, budget=64 * 1024 * 1024, checkpoint_interval=16):
+        self.canvas = canvas
+        self.budget = budget
+        self.checkpoint_interval = checkpoint_interval
+
+        self.entries = []  # Every entry; the ones from position on have been undone
+        self.position = 0
+        self.pending = []  # Strokes drawn since the last commit, in drawing order
+        self.last_key = None  # Who drew the last pending stroke
+        self.committed_text = []
+        self.transactions = set()  # Owners of the open transactions
+
+        self.checkpoints = {}  # Entry position -> (rect, pixels) of the canvas there
+        self.size = 0  # Bytes held by the checkpoints
+        self.scratch = PaintCanvas(canvas.width, canvas.height)  # Where states are rebuilt
+
+    def record_path(self, key, points, color, width):
+        """Record a polyline of (x, y) tuples drawn on the canvas by key (e.g. a hand)"""
+        stroke = self.pending[-1] if self.pending else None
+        # Segments of different drawers stay in separate strokes, in the order they were drawn
+        if (stroke is None or key != self.last_key or stroke.color != color
+                or stroke.width != width or stroke.points[-1] != points[0]):
+            stroke = Stroke(color, width, points[:1])
+            self.pending.append(stroke)
+            self.last_key = key
+        for point in points[1:]:
+            stroke.extend(point)
+
+    def begin(self, owner):
+        """Open a transaction for owner (a no-op if it is already open)"""
+        self.transactions.add(owner)
+
+    def end(self, owner):
+        self.transactions.discard(owner)
+
+    @staticmethod
+    def copy_text(text_objects):
+        # Objects are dicts changed in place (e.g. while dragging), so copy each one.
+        # Selecting text is not an undo step, so copies are stored unselected.
+        return [dict(obj, selected=False) for obj in text_objects]
+
+    def commit(self, text_objects):
+        """Record everything that changed since the last commit as one undo entry
+
+        Returns False without recording anything while a transaction is open.
+        """
+        if self.transactions:
+            return False
+        text = self.copy_text(text_objects)
+        text_changed = text != self.committed_text
+        if not self.pending and not text_changed:
+            return False
+
+        entry = {
+            'strokes': self.pending,
+            'text_before': self.committed_text if text_changed else None,
+            'text_after': text if text_changed else None,
+        }
+        self.pending = []
+        self.last_key = None
+        self.committed_text = text
+
+        # A new entry drops the undone ones and their checkpoints
+        del self.entries[self.position:]
+        for position in [p for p in self.checkpoints if p > self.position]:
+            self.drop_checkpoint(position)
+        self.entries.append(entry)
+        self.position += 1
+
+        if self.position % self.checkpoint_interval == 0:
+            self.add_checkpoint()
+        return True
+
+    def add_checkpoint(self):
+        bounds = self.canvas.bounds
+        if bounds is None:
+            checkpoint = (None, None)
+        else:
+            x0, y0, x1, y1 = bounds
+            checkpoint = (bounds, self.canvas.image[y0:y1, x0:x1].copy())
+            self.size += checkpoint[1].nbytes
+        self.checkpoints[self.position] = checkpoint
+
+        # Drop the oldest checkpoints first, replaying from further back is only slower
+        while self.size > self.budget and len(self.checkpoints) > 1:
+            self.drop_checkpoint(min(self.checkpoints))
+
+    def drop_checkpoint(self, position):
+        rect, pixels = self.checkpoints.pop(position)
+        if pixels is not None:
+            self.size -= pixels.nbytes
+
+    def strokes(self):
+        """Strokes of the current canvas, in drawing order"""
+        for entry in self.entries[:self.position]:
+            yield from entry['strokes']
+        yield from self.pending
+
+    def rebuild(self):
+        """Make the canvas match the current position: nearest checkpoint plus replay"""
+        start = max((p for p in self.checkpoints if p <= self.position), default=0)
+        scratch = self.scratch
+        scratch.image[:] = 0
+        scratch.mask[:] = 0
+        scratch.bounds = None
+        if start:
+            rect, pixels = self.checkpoints[start]
+            if rect is not None:
+                x0, y0, x1, y1 = rect
+                scratch.image[y0:y1, x0:x1] = pixels
+
+        for entry in self.entries[start:self.position]:
+            for stroke in entry['strokes']:
+                stroke.draw(scratch)
+        # Strokes still in progress (e.g. another hand) stay on top
+        for stroke in self.pending:
+            stroke.draw(scratch)
+
+        self.canvas.restore(scratch.image)
+
+    def apply(self, text):
+        if text is not None:
+            self.committed_text = text
+        self.rebuild()
+        return self.copy_text(self.committed_text)
+
+    def settle(self, text_objects):
+        """End every open transaction and commit what changed, so undo and redo start from the live state"""
+        self.transactions.clear()
+        self.commit(text_objects)
+
+    def undo(self, text_objects):
+        """Step back one entry from the live text_objects; returns the text objects to restore, or None"""
+        self.settle(text_objects)
+        if self.position == 0:
+            return None
+        self.position -= 1
+        return self.apply(self.entries[self.position]['text_before'])
+
+    def redo(self, text_objects):
+        """Step forward one entry from the live text_objects; returns the text objects to restore, or None"""
+        self.settle(text_objects)
+        if self.position == len(self.entries):
+            return None
+        self.position += 1
+        return self.apply(self.entries[self.position - 1]['text_after'])
@@ -72,6 +72,11 @@ def clear_session_state():
     auth_state = st.session_state.get('authenticated')
     user_type = st.session_state.get('user_type')
 
+    # Stop the capture thread before releasing the camera it reads from
+    if 'camera_stream' in st.session_state:
+        st.session_state.camera_stream.stop()
+        del st.session_state.camera_stream
+
     # Release camera if it exists
     if 'cap' in st.session_state:
         try: